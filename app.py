@@ -1,166 +1,510 @@
 # app.py
 import dash
-from dash import dcc, html, Input, Output
+from dash import dcc, html, Input, Output, State, Patch, ctx
+from dash.exceptions import PreventUpdate
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
+import os
+import time
+import threading
 import pandas as pd
+from functools import lru_cache, partial
 from data_cleaning import get_clean_data
+from dashboard_store import FrameStore, make_key, parse_key
+from snapshot import SnapshotHolder, snapshot_path
+from timeseries_store import get_store
+from shared_cache import SharedCache, render_lru_metrics
+from downsampling import downsample_series, DEFAULT_PLOT_WIDTH_PX
+from instrumentation import CallbackMetrics, get_records
 
-# Load the data
+_startup_started = time.perf_counter()
+
+FIGURE_CACHE_SIZE = 64
+NUMERIC_COLS = ['sales', 'cost', 'roas', 'daily_visitors', 'close', 'daily_return']
+# How long a page load waits for data when no cached snapshot exists yet
+LAYOUT_WAIT_SECONDS = 60
+# Long traces are reduced to about one point per pixel; zooming in restores full resolution
+TREND_MAX_POINTS = DEFAULT_PLOT_WIDTH_PX
+# Set DASHBOARD_EAGER_LOAD=1 to block startup until fresh data is loaded
+EAGER_LOAD = os.getenv('DASHBOARD_EAGER_LOAD') == '1'
+# Set DASHBOARD_AUTOLOAD=0 to publish data yourself (benchmarks, offline use)
+AUTOLOAD = os.getenv('DASHBOARD_AUTOLOAD', '1') == '1'
+# How often open pages check whether a newer snapshot has been published
+SNAPSHOT_POLL_SECONDS = 30
+# Symbols offered in the dropdown; each is loaded the first time someone selects it
+DASHBOARD_SYMBOLS = [s.strip().upper() for s in os.getenv('DASHBOARD_SYMBOLS', 'IBM,MSFT,AAPL,GOOGL,AMZN').split(',')
+                     if s.strip()]
+DASHBOARD_SYMBOL = os.getenv('DASHBOARD_SYMBOL', DASHBOARD_SYMBOLS[0]).upper()
+if DASHBOARD_SYMBOL not in DASHBOARD_SYMBOLS:
+    DASHBOARD_SYMBOLS.insert(0, DASHBOARD_SYMBOL)
+# How long a callback waits for the first load of a newly selected symbol
+SYMBOL_LOAD_WAIT_SECONDS = 20
+# Columns the trend chart reads from the time-series store
+TREND_COLUMNS = ['close', 'sales']
+
+# Load the data: serve the cached snapshot right away and refresh it in the background,
+# then again on a schedule (SNAPSHOT_REFRESH_SECONDS). Each snapshot is immutable and carries
+# its version and running moments, so any date window's statistics are O(1)
 print("Loading data for dashboard...")
-df = get_clean_data()
-print(f"Data loaded. Shape: {df.shape}")
+store = get_store()
+# Figures and metric cards shared by all worker processes, keyed by symbol and data version
+shared_cache = SharedCache()
+
+def load_dashboard_data(symbol):
+    """Runs the pipeline and writes the result to the time-series store the callbacks read from"""
+    df = get_clean_data(symbol)
+    if not df.empty:
+        store.write(symbol, df)
+    return df
+
+# One snapshot holder per symbol, created on first use
+_holders = {}
+_holders_lock = threading.Lock()
+
+def holder_for(symbol, eager=False):
+    """The snapshot holder of a symbol. Existing holders are looked up without locking."""
+    holder = _holders.get(symbol)
+    if holder is not None:
+        return holder
+    with _holders_lock:
+        holder = _holders.get(symbol)
+        if holder is None:
+            holder = SnapshotHolder(partial(load_dashboard_data, symbol), snapshot_path(symbol))
+            if AUTOLOAD and eager:
+                holder.refresh(force=True)
+            elif AUTOLOAD:
+                holder.load_cached()
+                holder.refresh_in_background()
+            if AUTOLOAD:
+                holder.start_scheduler()
+            _holders[symbol] = holder
+    return holder
+
+snapshots = holder_for(DASHBOARD_SYMBOL, eager=EAGER_LOAD)
+
+# Filtered slices live server-side; the browser only holds their key
+frame_store = FrameStore(max_entries=FIGURE_CACHE_SIZE)
 
 # Initialize the Dash app
 app = dash.Dash(__name__)
 server = app.server  # Expose the server for deployment
 
-# Calculate some overall metrics for the dashboard
-avg_sales = df['sales'].mean()
-avg_roas = df['roas'].mean()
-final_stock_price = df['close'].iloc[-1]
-best_campaign = df.groupby('campaign_id')['roas'].mean().idxmax()
-
-# Create the app layout
-app.layout = html.Div([
-    # Header
-    html.Div([
-        html.H1("Business Performance Dashboard", 
-                style={'textAlign': 'center', 'color': '#2c3e50', 'marginBottom': 30}),
-    ]),
+# Callback latency/error metrics for Prometheus, and the raw stage records as JSON
+callback_metrics = CallbackMetrics()
+
+@server.route('/metrics')
+def metrics():
+    text = callback_metrics.render() + shared_cache.render() + render_lru_metrics(LOCAL_CACHES)
+    return text, 200, {'Content-Type': 'text/plain; version=0.0.4'}
+
+@server.route('/metrics/cache')
+def cache_metrics():
+    local = {func.__name__: func.cache_info()._asdict() for func in LOCAL_CACHES}
+    return {'shared': shared_cache.stats(), 'local': local}
+
+@server.route('/metrics/stages')
+def stage_metrics():
+    return {'stages': get_records()}
+
+def current_snapshot(symbol=DASHBOARD_SYMBOL, wait_seconds=0):
+    holder = holder_for(symbol)
+    snapshot = holder.current or (holder.wait(wait_seconds) if wait_seconds else None)
+    if snapshot is None:
+        raise PreventUpdate  # Data is still loading
+    return snapshot
+
+def snapshot_for(data_key):
+    """The snapshot a store key was made from. Keys of versions no longer held are dropped;
+    the page's next poll resolves its date range against the current snapshot."""
+    symbol, version, a, b = parse_key(data_key)
+    snapshot = holder_for(symbol).get(version)
+    if snapshot is None:
+        raise PreventUpdate
+    return snapshot, a, b
+
+def format_metric_cards(kpis):
+    """Values of the four metric cards"""
+    return [f"${kpis.avg_sales:.2f}", f"{kpis.avg_roas:.2f}x",
+            f"${kpis.final_stock_price:.2f}", f"{kpis.best_campaign}"]
+
+def cube_window(data_key):
+    """The snapshot's aggregate cube and the day positions covered by a store key's rows"""
+    snapshot, a, b = snapshot_for(data_key)
+    cube = snapshot.cube
+    if b <= a:
+        return cube, 0, 0
+    return cube, *cube.positions(snapshot.df.index[a], snapshot.df.index[b - 1])
+
+def build_layout(snapshot):
+    """Builds the page for a snapshot; with no snapshot yet, the metric cards show placeholders"""
+    if snapshot is not None:
+        # Overall metrics for the default symbol; callbacks update them for the selected one
+        kpis = snapshot.kpis
+        avg_sales, avg_roas, final_stock_price, best_campaign = format_metric_cards(kpis)
+        start_date, end_date = kpis.start_date, kpis.end_date
+    else:
+        avg_sales = avg_roas = final_stock_price = best_campaign = "Loading..."
+        start_date = end_date = None
+
+    # Create the app layout
+    return html.Div([
+        # Header
+        html.Div([
+            html.H1("Business Performance Dashboard", 
+                    style={'textAlign': 'center', 'color': '#2c3e50', 'marginBottom': 30}),
+        ]),
+
+        # Symbol Selector
+        html.Div([
+            html.Label("Symbol:", style={'fontWeight': 'bold', 'marginRight': '10px'}),
+            dcc.Dropdown(
+                id='symbol-dropdown',
+                options=DASHBOARD_SYMBOLS,
+                value=DASHBOARD_SYMBOL,
+                clearable=False,
+                style={'width': '200px', 'display': 'inline-block', 'verticalAlign': 'middle'}
+            )
+        ], style={'margin': '20px', 'textAlign': 'center'}),
     
-    # Key Metrics Cards
-    html.Div([
+        # Key Metrics Cards
         html.Div([
-            html.H3("Avg. Daily Sales", style={'color': '#7f8c8d', 'fontSize': '1.2em'}),
-            html.H2(f"${avg_sales:.2f}", style={'color': '#2c3e50', 'fontSize': '2em'})
-        ], className='metric-card', style={
-            'backgroundColor': '#f8f9fa', 'padding': '20px', 'borderRadius': '10px',
-            'textAlign': 'center', 'boxShadow': '0 2px 4px rgba(0,0,0,0.1)', 'margin': '10px'
-        }),
+            html.Div([
+                html.H3("Avg. Daily Sales", style={'color': '#7f8c8d', 'fontSize': '1.2em'}),
+                html.H2(avg_sales, id='metric-avg-sales', style={'color': '#2c3e50', 'fontSize': '2em'})
+            ], className='metric-card', style={
+                'backgroundColor': '#f8f9fa', 'padding': '20px', 'borderRadius': '10px',
+                'textAlign': 'center', 'boxShadow': '0 2px 4px rgba(0,0,0,0.1)', 'margin': '10px'
+            }),
         
-        html.Div([
-            html.H3("Avg. ROAS", style={'color': '#7f8c8d', 'fontSize': '1.2em'}),
-            html.H2(f"{avg_roas:.2f}x", style={'color': '#2c3e50', 'fontSize': '2em'})
-        ], className='metric-card', style={
-            'backgroundColor': '#f8f9fa', 'padding': '20px', 'borderRadius': '10px',
-            'textAlign': 'center', 'boxShadow': '0 2px 4px rgba(0,0,0,0.1)', 'margin': '10px'
-        }),
+            html.Div([
+                html.H3("Avg. ROAS", style={'color': '#7f8c8d', 'fontSize': '1.2em'}),
+                html.H2(avg_roas, id='metric-avg-roas', style={'color': '#2c3e50', 'fontSize': '2em'})
+            ], className='metric-card', style={
+                'backgroundColor': '#f8f9fa', 'padding': '20px', 'borderRadius': '10px',
+                'textAlign': 'center', 'boxShadow': '0 2px 4px rgba(0,0,0,0.1)', 'margin': '10px'
+            }),
         
-        html.Div([
-            html.H3("Current Stock Price", style={'color': '#7f8c8d', 'fontSize': '1.2em'}),
-            html.H2(f"${final_stock_price:.2f}", style={'color': '#2c3e50', 'fontSize': '2em'})
-        ], className='metric-card', style={
-            'backgroundColor': '#f8f9fa', 'padding': '20px', 'borderRadius': '10px',
-            'textAlign': 'center', 'boxShadow': '0 2px 4px rgba(0,0,0,0.1)', 'margin': '10px'
-        }),
+            html.Div([
+                html.H3("Current Stock Price", style={'color': '#7f8c8d', 'fontSize': '1.2em'}),
+                html.H2(final_stock_price, id='metric-stock-price', style={'color': '#2c3e50', 'fontSize': '2em'})
+            ], className='metric-card', style={
+                'backgroundColor': '#f8f9fa', 'padding': '20px', 'borderRadius': '10px',
+                'textAlign': 'center', 'boxShadow': '0 2px 4px rgba(0,0,0,0.1)', 'margin': '10px'
+            }),
         
-        html.Div([
-            html.H3("Best Campaign", style={'color': '#7f8c8d', 'fontSize': '1.2em'}),
-            html.H2(f"{best_campaign}", style={'color': '#2c3e50', 'fontSize': '2em'})
-        ], className='metric-card', style={
-            'backgroundColor': '#f8f9fa', 'padding': '20px', 'borderRadius': '10px',
-            'textAlign': 'center', 'boxShadow': '0 2px 4px rgba(0,0,0,0.1)', 'margin': '10px'
-        }),
-    ], style={'display': 'flex', 'justifyContent': 'space-around', 'flexWrap': 'wrap', 'marginBottom': '30px'}),
+            html.Div([
+                html.H3("Best Campaign", style={'color': '#7f8c8d', 'fontSize': '1.2em'}),
+                html.H2(best_campaign, id='metric-best-campaign', style={'color': '#2c3e50', 'fontSize': '2em'})
+            ], className='metric-card', style={
+                'backgroundColor': '#f8f9fa', 'padding': '20px', 'borderRadius': '10px',
+                'textAlign': 'center', 'boxShadow': '0 2px 4px rgba(0,0,0,0.1)', 'margin': '10px'
+            }),
+        ], style={'display': 'flex', 'justifyContent': 'space-around', 'flexWrap': 'wrap', 'marginBottom': '30px'}),
     
-    # Date Range Selector
-    html.Div([
-        html.Label("Select Date Range:", style={'fontWeight': 'bold', 'marginRight': '10px'}),
-        dcc.DatePickerRange(
-            id='date-picker-range',
-            start_date=df.index.min(),
-            end_date=df.index.max(),
-            display_format='YYYY-MM-DD'
-        )
-    ], style={'margin': '20px', 'textAlign': 'center'}),
+        # Date Range Selector
+        html.Div([
+            html.Label("Select Date Range:", style={'fontWeight': 'bold', 'marginRight': '10px'}),
+            dcc.DatePickerRange(
+                id='date-picker-range',
+                start_date=start_date,
+                end_date=end_date,
+                display_format='YYYY-MM-DD'
+            )
+        ], style={'margin': '20px', 'textAlign': 'center'}),
+
+        # Key of the filtered data in the server-side store
+        dcc.Store(id='filtered-data-key'),
+        # Re-resolves the key when a refresh publishes a new snapshot version
+        dcc.Interval(id='snapshot-poll', interval=SNAPSHOT_POLL_SECONDS * 1000),
     
-    # Charts Row 1
-    html.Div([
-        # Stock Price vs Sales Trend
+        # Charts Row 1
         html.Div([
-            html.H3("Stock Price vs Marketing Sales Trend", style={'textAlign': 'center'}),
-            dcc.Graph(id='trend-chart')
-        ], style={'width': '48%', 'display': 'inline-block', 'padding': '10px'}),
+            # Stock Price vs Sales Trend
+            html.Div([
+                html.H3("Stock Price vs Marketing Sales Trend", style={'textAlign': 'center'}),
+                dcc.Graph(id='trend-chart')
+            ], style={'width': '48%', 'display': 'inline-block', 'padding': '10px'}),
         
-        # ROAS by Campaign
-        html.Div([
-            html.H3("ROAS by Marketing Campaign", style={'textAlign': 'center'}),
-            dcc.Graph(id='roas-chart')
-        ], style={'width': '48%', 'display': 'inline-block', 'padding': '10px'}),
-    ]),
+            # ROAS by Campaign
+            html.Div([
+                html.H3("ROAS by Marketing Campaign", style={'textAlign': 'center'}),
+                dcc.Graph(id='roas-chart')
+            ], style={'width': '48%', 'display': 'inline-block', 'padding': '10px'}),
+        ]),
     
-    # Charts Row 2
-    html.Div([
-        # Correlation Heatmap
+        # Charts Row 2
         html.Div([
-            html.H3("Metrics Correlation Heatmap", style={'textAlign': 'center'}),
-            dcc.Graph(id='correlation-chart')
-        ], style={'width': '48%', 'display': 'inline-block', 'padding': '10px'}),
+            # Correlation Heatmap
+            html.Div([
+                html.H3("Metrics Correlation Heatmap", style={'textAlign': 'center'}),
+                dcc.Graph(id='correlation-chart')
+            ], style={'width': '48%', 'display': 'inline-block', 'padding': '10px'}),
         
-        # Daily Returns Distribution
-        html.Div([
-            html.H3("Stock Daily Returns Distribution", style={'textAlign': 'center'}),
-            dcc.Graph(id='returns-chart')
-        ], style={'width': '48%', 'display': 'inline-block', 'padding': '10px'}),
-    ]),
+            # Daily Returns Distribution
+            html.Div([
+                html.H3("Stock Daily Returns Distribution", style={'textAlign': 'center'}),
+                dcc.Graph(id='returns-chart')
+            ], style={'width': '48%', 'display': 'inline-block', 'padding': '10px'}),
+        ]),
     
-    # Footer
-    html.Div([
-        html.P("Data automatically updated from Alpha Vantage API and marketing sources", 
-              style={'textAlign': 'center', 'color': '#7f8c8d', 'marginTop': '50px'})
-    ])
-], style={'fontFamily': 'Arial, sans-serif', 'padding': '20px'})
-
-# Callback for updating charts based on date selection
+        # Footer
+        html.Div([
+            html.P("Data automatically updated from Alpha Vantage API and marketing sources", 
+                  style={'textAlign': 'center', 'color': '#7f8c8d', 'marginTop': '50px'})
+        ])
+    ], style={'fontFamily': 'Arial, sans-serif', 'padding': '20px'})
+
+def serve_layout():
+    snapshot = snapshots.current or snapshots.wait(LAYOUT_WAIT_SECONDS)
+    return build_layout(snapshot)
+
+# The layout is built per page load, so startup never waits on data. The validation layout
+# must be set first: otherwise Dash calls serve_layout() at assignment to validate it.
+app.validation_layout = build_layout(None)
+app.layout = serve_layout
+
+def get_filtered_data(data_key, columns=TREND_COLUMNS):
+    """
+    Returns the given columns for a store key's date range, read from the time-series store
+    (only those columns and dates are read). Falls back to slicing the snapshot when the
+    store doesn't hold the key's data version, e.g. for data published directly or when a
+    refresh has already replaced the stored rows.
+    """
+    snapshot, a, b = snapshot_for(data_key)
+    symbol = parse_key(data_key)[0]
+
+    def read():
+        if b <= a:
+            return snapshot.df.iloc[0:0][columns]
+        if store.has_columns(columns):
+            df = store.query(symbol, columns, snapshot.df.index[a], snapshot.df.index[b - 1],
+                             version=snapshot.version)
+            if df is not None and not df.empty:
+                return df
+        return snapshot.df.iloc[a:b][columns]
+    return frame_store.get_or_create(f"{data_key}|{','.join(columns)}", read)
+
+# Callback for resolving the date selection into a server-side data key.
+# Keys include the snapshot version, so every cache keyed on them moves to new data by itself
 @app.callback(
-    [Output('trend-chart', 'figure'),
-     Output('roas-chart', 'figure'),
-     Output('correlation-chart', 'figure'),
-     Output('returns-chart', 'figure')],
-    [Input('date-picker-range', 'start_date'),
-     Input('date-picker-range', 'end_date')]
+    Output('filtered-data-key', 'data'),
+    [Input('symbol-dropdown', 'value'),
+     Input('date-picker-range', 'start_date'),
+     Input('date-picker-range', 'end_date'),
+     Input('snapshot-poll', 'n_intervals')],
+    State('filtered-data-key', 'data')
 )
-def update_charts(start_date, end_date):
-    # Filter data based on selected date range
-    filtered_df = df.loc[start_date:end_date]
-    
-    # 1. Trend Chart (Stock Price vs Sales)
+@callback_metrics.wrap('filtered_data')
+def update_filtered_data(symbol, start_date, end_date, n_intervals=None, current_key=None):
+    # Filter data based on selected date range (read the snapshot once: it may be swapped meanwhile)
+    symbol = symbol or DASHBOARD_SYMBOL
+    if symbol not in DASHBOARD_SYMBOLS:
+        raise PreventUpdate  # Only offered symbols are ever fetched
+    snapshot = current_snapshot(symbol, SYMBOL_LOAD_WAIT_SECONDS)
+    a, b = snapshot.positions(start_date, end_date)
+    data_key = make_key(symbol, snapshot.version, a, b)
+    if data_key == current_key:
+        raise PreventUpdate  # Poll found the same version: nothing to redraw
+    return data_key
+
+@lru_cache(maxsize=FIGURE_CACHE_SIZE)
+@shared_cache.cached('metric_cards')
+def build_metric_cards(symbol, version):
+    snapshot = holder_for(symbol).get(version)
+    if snapshot is None:
+        raise PreventUpdate
+    return format_metric_cards(snapshot.kpis)
+
+# Metric cards follow the selected symbol and its latest data version
+@app.callback(
+    [Output('metric-avg-sales', 'children'),
+     Output('metric-avg-roas', 'children'),
+     Output('metric-stock-price', 'children'),
+     Output('metric-best-campaign', 'children')],
+    Input('filtered-data-key', 'data')
+)
+@callback_metrics.wrap('metric_cards')
+def update_metric_cards(data_key):
+    if data_key is None:
+        raise PreventUpdate
+    symbol, version, _, _ = parse_key(data_key)
+    return build_metric_cards(symbol, version)
+
+# One callback per chart so a slow figure doesn't hold up the others.
+# The first render sends the full figure; later date changes only patch trace data.
+
+def needs_full_figure(data_key, current_figure):
+    if data_key is None:
+        raise PreventUpdate
+    return not current_figure or not current_figure.get('data')
+
+def visible_x_range(relayout_data):
+    """Zoomed x-axis range from a relayoutData event; None when autoscaled or not an x-axis event"""
+    if not relayout_data or relayout_data.get('xaxis.autorange'):
+        return None
+    if 'xaxis.range[0]' in relayout_data:
+        return relayout_data['xaxis.range[0]'], relayout_data['xaxis.range[1]']
+    if 'xaxis.range' in relayout_data:
+        return tuple(relayout_data['xaxis.range'])
+    return None
+
+def trend_traces(filtered_df, x_range=None):
+    """Close and sales series for the visible range, downsampled with LTTB"""
+    if x_range is not None:
+        filtered_df = filtered_df.loc[x_range[0]:x_range[1]]
+    close = downsample_series(filtered_df['close'], TREND_MAX_POINTS)
+    sales = downsample_series(filtered_df['sales'], TREND_MAX_POINTS)
+    return close, sales
+
+# Full figures are also shared across worker processes: keys carry symbol and version
+
+@lru_cache(maxsize=FIGURE_CACHE_SIZE)
+@shared_cache.cached('figure.trend')
+def build_trend_figure(data_key):
+    close, sales = trend_traces(get_filtered_data(data_key))
     fig_trend = make_subplots(specs=[[{"secondary_y": True}]])
     fig_trend.add_trace(
-        go.Scatter(x=filtered_df.index, y=filtered_df['close'], name="Stock Price", line=dict(color='red')),
+        go.Scatter(x=close.index, y=close, name="Stock Price", line=dict(color='red')),
         secondary_y=False,
     )
     fig_trend.add_trace(
-        go.Scatter(x=filtered_df.index, y=filtered_df['sales'], name="Marketing Sales", line=dict(color='blue', dash='dot')),
+        go.Scatter(x=sales.index, y=sales, name="Marketing Sales", line=dict(color='blue', dash='dot')),
         secondary_y=True,
     )
     fig_trend.update_layout(title_text="Stock Price vs Marketing Sales Over Time")
     fig_trend.update_xaxes(title_text="Date")
     fig_trend.update_yaxes(title_text="Stock Price ($)", secondary_y=False)
     fig_trend.update_yaxes(title_text="Sales ($)", secondary_y=True)
-    
-    # 2. ROAS by Campaign
-    fig_roas = px.box(filtered_df, x='campaign_id', y='roas', 
-                     title="Return on Ad Spend by Campaign")
-    fig_roas.update_layout(yaxis_title="ROAS", xaxis_title="Campaign")
-    
-    # 3. Correlation Heatmap
-    numeric_cols = ['sales', 'cost', 'roas', 'daily_visitors', 'close', 'daily_return']
-    correlation_matrix = filtered_df[numeric_cols].corr()
-    fig_corr = px.imshow(correlation_matrix, 
+    return fig_trend
+
+@app.callback(
+    Output('trend-chart', 'figure'),
+    Input('filtered-data-key', 'data'),
+    Input('trend-chart', 'relayoutData'),
+    State('trend-chart', 'figure')
+)
+@callback_metrics.wrap('trend_chart')
+def update_trend_chart(data_key, relayout_data, current_figure):
+    if needs_full_figure(data_key, current_figure):
+        return build_trend_figure(data_key)
+    patch = Patch()
+    x_range = None
+    if ctx.triggered_id == 'trend-chart':
+        # Zoom/pan: resample the visible window at full resolution where possible
+        x_range = visible_x_range(relayout_data)
+        if x_range is None and not (relayout_data or {}).get('xaxis.autorange'):
+            raise PreventUpdate
+    else:
+        # New date range: drop any zoom from the previous range
+        patch['layout']['xaxis']['autorange'] = True
+    close, sales = trend_traces(get_filtered_data(data_key), x_range)
+    patch['data'][0]['x'] = close.index
+    patch['data'][0]['y'] = close.to_numpy()
+    patch['data'][1]['x'] = sales.index
+    patch['data'][1]['y'] = sales.to_numpy()
+    return patch
+
+# The ROAS box plot, returns histogram and heatmap are drawn from the aggregate cube:
+# merging per-day partials, whatever the number of rows in the range
+
+@lru_cache(maxsize=FIGURE_CACHE_SIZE)
+def build_roas_stats(data_key):
+    cube, a, b = cube_window(data_key)
+    return cube.box_stats('roas', a, b)
+
+def roas_box_values(stats):
+    return {'x': stats.index.to_numpy(), 'q1': stats['q1'].to_numpy(), 'median': stats['median'].to_numpy(),
+            'q3': stats['q3'].to_numpy(), 'lowerfence': stats['lowerfence'].to_numpy(),
+            'upperfence': stats['upperfence'].to_numpy(), 'mean': stats['mean'].to_numpy()}
+
+@lru_cache(maxsize=FIGURE_CACHE_SIZE)
+@shared_cache.cached('figure.roas')
+def build_roas_figure(data_key):
+    fig_roas = go.Figure(go.Box(name='roas', **roas_box_values(build_roas_stats(data_key))))
+    fig_roas.update_layout(title_text="Return on Ad Spend by Campaign",
+                           yaxis_title="ROAS", xaxis_title="Campaign")
+    return fig_roas
+
+@app.callback(
+    Output('roas-chart', 'figure'),
+    Input('filtered-data-key', 'data'),
+    State('roas-chart', 'figure')
+)
+@callback_metrics.wrap('roas_chart')
+def update_roas_chart(data_key, current_figure):
+    if needs_full_figure(data_key, current_figure):
+        return build_roas_figure(data_key)
+    patch = Patch()
+    for name, values in roas_box_values(build_roas_stats(data_key)).items():
+        patch['data'][0][name] = values
+    return patch
+
+@lru_cache(maxsize=FIGURE_CACHE_SIZE)
+def build_correlation_matrix(data_key):
+    # From the cube's cross-products, no rescan of the rows
+    cube, a, b = cube_window(data_key)
+    return cube.corr(a, b).reindex(index=NUMERIC_COLS, columns=NUMERIC_COLS)
+
+@lru_cache(maxsize=FIGURE_CACHE_SIZE)
+@shared_cache.cached('figure.correlation')
+def build_correlation_figure(data_key):
+    fig_corr = px.imshow(build_correlation_matrix(data_key), 
                         text_auto=True, 
                         aspect="auto",
                         title="Correlation Between Metrics")
-    
-    # 4. Daily Returns Distribution
-    fig_returns = px.histogram(filtered_df, x='daily_return', 
-                              nbins=30, 
-                              title="Distribution of Daily Stock Returns")
-    fig_returns.update_layout(xaxis_title="Daily Return (%)", yaxis_title="Frequency")
-    
-    return fig_trend, fig_roas, fig_corr, fig_returns
+    return fig_corr
+
+@app.callback(
+    Output('correlation-chart', 'figure'),
+    Input('filtered-data-key', 'data'),
+    State('correlation-chart', 'figure')
+)
+@callback_metrics.wrap('correlation_chart')
+def update_correlation_chart(data_key, current_figure):
+    if needs_full_figure(data_key, current_figure):
+        return build_correlation_figure(data_key)
+    patch = Patch()
+    patch['data'][0]['z'] = build_correlation_matrix(data_key).to_numpy()
+    return patch
+
+@lru_cache(maxsize=FIGURE_CACHE_SIZE)
+def build_returns_histogram(data_key):
+    # Fixed bins over the whole history, summed over the range
+    cube, a, b = cube_window(data_key)
+    counts, edges = cube.histogram('daily_return', a, b)
+    return (edges[:-1] + edges[1:]) / 2, counts, edges[1] - edges[0]
+
+@lru_cache(maxsize=FIGURE_CACHE_SIZE)
+@shared_cache.cached('figure.returns')
+def build_returns_figure(data_key):
+    centers, counts, width = build_returns_histogram(data_key)
+    fig_returns = go.Figure(go.Bar(x=centers, y=counts, width=width, name='daily_return'))
+    fig_returns.update_layout(title_text="Distribution of Daily Stock Returns", bargap=0,
+                              xaxis_title="Daily Return (%)", yaxis_title="Frequency")
+    return fig_returns
+
+@app.callback(
+    Output('returns-chart', 'figure'),
+    Input('filtered-data-key', 'data'),
+    State('returns-chart', 'figure')
+)
+@callback_metrics.wrap('returns_chart')
+def update_returns_chart(data_key, current_figure):
+    if needs_full_figure(data_key, current_figure):
+        return build_returns_figure(data_key)
+    centers, counts, width = build_returns_histogram(data_key)
+    patch = Patch()
+    patch['data'][0]['x'] = centers
+    patch['data'][0]['y'] = counts
+    patch['data'][0]['width'] = width
+    return patch
+
+# In-process caches reported at /metrics
+LOCAL_CACHES = [build_metric_cards, build_trend_figure, build_roas_stats, build_roas_figure,
+                build_correlation_matrix, build_correlation_figure, build_returns_histogram, build_returns_figure]
+
+print(f"Dashboard ready in {time.perf_counter() - _startup_started:.2f}s")
 
 if __name__ == '__main__':
     print("Starting Dash server...")
@@ -0,0 +1,39 @@
+# benchmarks/memory.py
+"""
+Peak memory of cleaning and merging, default vs optimized (compact dtypes + copy-on-write).
+
+    python -m benchmarks.memory [rows]
+"""
+import sys
+import tracemalloc
+import pandas as pd
+from benchmarks.synthetic import synthetic_stock_data, synthetic_marketing_data
+from data_cleaning import clean_and_transform_Stock_data, clean_and_transform_marketing_data, merge_datasets
+
+
+def measure_peak_memory(rows=5_000_000):
+    """
+    Runs cleaning and merging on synthetic data of the given size in both modes
+    and prints the peak traced memory of each. The marketing rows are on the stock
+    dates already, so the merge is the aligned one the pipeline uses.
+    """
+    stock_raw = synthetic_stock_data(rows)
+    marketing_raw = synthetic_marketing_data(rows)
+
+    peaks = {}
+    for optimized in (False, True):
+        tracemalloc.start()
+        with pd.option_context('mode.copy_on_write', optimized):
+            stock_clean = clean_and_transform_Stock_data(stock_raw, optimized=optimized)
+            marketing_clean = clean_and_transform_marketing_data(marketing_raw, optimized=optimized)
+            merged = merge_datasets(stock_clean, marketing_clean, optimized=optimized, aligned=True)
+        _, peaks[optimized] = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result_mb = merged.memory_usage(deep=True).sum() / 1e6
+        print(f"optimized={optimized}: peak {peaks[optimized] / 1e6:.1f} MB, result {result_mb:.1f} MB")
+        del stock_clean, marketing_clean, merged
+    print(f"Peak memory reduction: {1 - peaks[True] / peaks[False]:.0%}")
+
+
+if __name__ == "__main__":
+    measure_peak_memory(int(sys.argv[1]) if len(sys.argv) > 1 else 5_000_000)
@@ -0,0 +1,411 @@
+# benchmarks/run.py
+"""
+Offline benchmark suite for the whole pipeline.
+
+    python -m benchmarks.run                          # default scales, results saved per commit
+    python -m benchmarks.run --scales 1000 1000000 --filter clean
+    python -m benchmarks.run --compare <commit-a> <commit-b>
+
+Results are written to benchmarks/results/<commit>.json.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import shutil
+import subprocess
+import tempfile
+from datetime import datetime
+
+# The dashboard must not fetch live data when imported here
+os.environ.setdefault('DASHBOARD_AUTOLOAD', '0')
+# Keep cached charts and compiled templates away from the real cache
+os.environ.setdefault('DATA_CACHE_DIR', tempfile.mkdtemp(prefix='benchmark-cache-'))
+
+import numpy as np
+import pandas as pd
+from benchmarks.synthetic import (synthetic_stock_data, synthetic_stock_data_many,
+                                  synthetic_marketing_data, synthetic_clean_data)
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+DEFAULT_SCALES = (1_000, 100_000, 1_000_000)
+
+BENCHMARKS = {}
+
+
+def benchmark(name, max_rows=None):
+    """Registers a setup function: setup(rows) returns the zero-argument callable to time.
+    Benchmarks are skipped for scales above max_rows (e.g. rendering a PDF of 100M points)."""
+    def decorator(setup):
+        BENCHMARKS[name] = (setup, max_rows)
+        return setup
+    return decorator
+
+
+@benchmark('clean.stock')
+def bench_clean_stock(rows):
+    from data_cleaning import clean_and_transform_Stock_data
+    stock = synthetic_stock_data(rows)
+    return lambda: clean_and_transform_Stock_data(stock)
+
+
+@benchmark('clean.stock_optimized')
+def bench_clean_stock_optimized(rows):
+    from data_cleaning import clean_and_transform_Stock_data
+    stock = synthetic_stock_data(rows)
+    return lambda: clean_and_transform_Stock_data(stock, optimized=True)
+
+
+@benchmark('clean.stock_many_symbols')
+def bench_clean_stock_many_symbols(rows):
+    from data_cleaning import clean_and_transform_Stock_data
+    symbols = 100
+    stock_all = synthetic_stock_data_many(max(rows // symbols, 10), symbols=symbols)
+    frames = [stock_all.xs(symbol, level='symbol') for symbol in stock_all.index.unique('symbol')]
+    return lambda: [clean_and_transform_Stock_data(frame) for frame in frames]
+
+
+@benchmark('clean.marketing')
+def bench_clean_marketing(rows):
+    from data_cleaning import clean_and_transform_marketing_data
+    marketing = synthetic_marketing_data(rows)
+    return lambda: clean_and_transform_marketing_data(marketing)
+
+
+@benchmark('clean.marketing_optimized')
+def bench_clean_marketing_optimized(rows):
+    from data_cleaning import clean_and_transform_marketing_data
+    marketing = synthetic_marketing_data(rows)
+    return lambda: clean_and_transform_marketing_data(marketing, optimized=True)
+
+
+@benchmark('merge')
+def bench_merge(rows):
+    from data_cleaning import clean_and_transform_Stock_data, clean_and_transform_marketing_data, merge_datasets
+    stock = clean_and_transform_Stock_data(synthetic_stock_data(rows))
+    marketing = clean_and_transform_marketing_data(synthetic_marketing_data(rows))
+    return lambda: merge_datasets(stock, marketing)
+
+
+def _calendar_marketing(rows):
+    # Marketing rows on every calendar day (sub-minute steps at scale), so some fall between trading bars
+    return synthetic_marketing_data(rows, freq='D' if rows <= 60_000 else '20s')
+
+
+@benchmark('merge.calendar_join')
+def bench_merge_calendar_join(rows):
+    # The previous pipeline: calendar-dated marketing rows inner-joined to trading days
+    from data_cleaning import clean_and_transform_Stock_data, clean_and_transform_marketing_data, merge_datasets
+    stock = clean_and_transform_Stock_data(synthetic_stock_data(rows))
+    marketing = clean_and_transform_marketing_data(_calendar_marketing(rows))
+    return lambda: merge_datasets(stock, marketing)
+
+
+@benchmark('align.aggregate')
+def bench_align_aggregate(rows):
+    from data_acquisition import align_marketing_dates
+    stock_dates = synthetic_stock_data(rows).index
+    marketing = _calendar_marketing(rows)
+    return lambda: align_marketing_dates(marketing, stock_dates, policy='aggregate')
+
+
+@benchmark('align.ffill')
+def bench_align_ffill(rows):
+    from data_acquisition import align_marketing_dates
+    stock_dates = synthetic_stock_data(rows).index
+    marketing = _calendar_marketing(rows)
+    return lambda: align_marketing_dates(marketing, stock_dates, policy='ffill')
+
+
+@benchmark('merge.aligned')
+def bench_merge_aligned(rows):
+    from data_acquisition import align_marketing_dates
+    from data_cleaning import clean_and_transform_Stock_data, clean_and_transform_marketing_data, merge_datasets
+    stock_raw = synthetic_stock_data(rows)
+    stock = clean_and_transform_Stock_data(stock_raw)
+    marketing = clean_and_transform_marketing_data(align_marketing_dates(_calendar_marketing(rows), stock_raw.index))
+    return lambda: merge_datasets(stock, marketing, aligned=True)
+
+
+@benchmark('insights')
+def bench_insights(rows):
+    from report_utils import generate_insights
+    df = synthetic_clean_data(rows)
+    return lambda: generate_insights(df)
+
+
+@benchmark('kpis')
+def bench_kpis(rows):
+    from kpis import compute_kpis
+    df = synthetic_clean_data(rows)
+    return lambda: compute_kpis(df)
+
+
+@benchmark('indicators')
+def bench_indicators(rows):
+    from indicators import compute_indicators
+    df = synthetic_clean_data(rows)
+    return lambda: compute_indicators(df)
+
+
+@benchmark('indicators.many_symbols')
+def bench_indicators_many_symbols(rows):
+    from indicators import compute_indicators_many
+    symbols = 200
+    stock_all = synthetic_stock_data_many(max(rows // symbols, 10), symbols=symbols)
+    return lambda: compute_indicators_many(stock_all)
+
+
+@benchmark('indicators.append_day', max_rows=1_000_000)
+def bench_indicators_append_day(rows):
+    from indicators import IndicatorState
+    df = synthetic_clean_data(rows)
+    state = IndicatorState.from_history(df.iloc[:-1])
+    close, sales = float(df['close'].iloc[-1]), float(df['sales'].iloc[-1])
+    dates = iter(pd.date_range(df.index[-1], periods=10_000_000, freq='min'))
+
+    def run():
+        # One new day: cost should stay flat as the history grows
+        state.append(next(dates), close, sales)
+    return run
+
+
+@benchmark('cube.build')
+def bench_cube_build(rows):
+    from aggregate_cube import AggregateCube
+    df = synthetic_clean_data(rows)
+    return lambda: AggregateCube.build(df)
+
+
+@benchmark('cube.range_query')
+def bench_cube_range_query(rows):
+    from aggregate_cube import AggregateCube
+    cube = AggregateCube.build(synthetic_clean_data(rows))
+    a, b = len(cube.days) // 4, 3 * len(cube.days) // 4
+
+    def run():
+        # Everything the dashboard's ROAS, returns and heatmap charts need for one date range
+        cube.corr(a, b)
+        cube.box_stats('roas', a, b)
+        cube.histogram('daily_return', a, b)
+    return run
+
+
+@benchmark('store.write', max_rows=1_000_000)
+def bench_store_write(rows):
+    from timeseries_store import TimeSeriesStore
+    store = TimeSeriesStore(os.path.join(tempfile.mkdtemp(), 'timeseries.sqlite'))
+    df = synthetic_clean_data(rows)
+    return lambda: store.write('SYM', df)
+
+
+@benchmark('store.query_window')
+def bench_store_query_window(rows):
+    from timeseries_store import TimeSeriesStore
+    store = TimeSeriesStore(os.path.join(tempfile.mkdtemp(), 'timeseries.sqlite'))
+    df = synthetic_clean_data(rows)
+    store.write('SYM', df)
+    start, end = df.index[len(df) // 2], df.index[len(df) // 2 + min(len(df) // 10, 250)]
+    # What the trend chart reads: two columns of a short window
+    return lambda: store.query('SYM', ['close', 'sales'], start, end)
+
+
+@benchmark('chart.trend', max_rows=10_000_000)
+def bench_chart_trend(rows):
+    from report_utils import render_chart
+    df = synthetic_clean_data(rows)
+    return lambda: render_chart('trend', df, use_cache=False)
+
+
+@benchmark('chart.roas', max_rows=10_000_000)
+def bench_chart_roas(rows):
+    from report_utils import render_chart
+    df = synthetic_clean_data(rows)
+    return lambda: render_chart('roas', df, use_cache=False)
+
+
+def _report_html(rows):
+    from report_utils import create_trend_chart_base64, create_roas_chart_base64
+    df = synthetic_clean_data(rows)
+    return df, create_trend_chart_base64(df), create_roas_chart_base64(df)
+
+
+@benchmark('report.html', max_rows=1_000_000)
+def bench_report_html(rows):
+    from generate_report import render_report_html
+    df, trend, roas = _report_html(rows)
+    return lambda: render_report_html(df, trend, roas)
+
+
+@benchmark('report.pdf', max_rows=1_000_000)
+def bench_report_pdf(rows):
+    from generate_report import render_report_html, convert_html_to_pdf
+    html = render_report_html(*_report_html(rows))
+    output = os.path.join(tempfile.mkdtemp(), 'report.pdf')
+    return lambda: convert_html_to_pdf(html, output)
+
+
+def _bench_report_mode(mode):
+    """Per-report latency of one PDF mode: KPIs, charts, HTML (if any) and PDF, with a cold chart cache"""
+    def setup(rows):
+        from generate_report import build_report_pdf
+        from report_utils import CHART_CACHE_DIR
+        df = synthetic_clean_data(rows)
+        output = os.path.join(tempfile.mkdtemp(), 'report.pdf')
+
+        def run():
+            shutil.rmtree(CHART_CACHE_DIR, ignore_errors=True)
+            if not build_report_pdf(df, output, mode):
+                raise RuntimeError(f"{mode} report failed")
+        return run
+    return setup
+
+
+for _mode in ('html', 'fast', 'direct'):
+    benchmark(f'report.latency_{_mode}', max_rows=1_000_000)(_bench_report_mode(_mode))
+
+
+@benchmark('report.service_burst', max_rows=100_000)
+def bench_report_service_burst(rows):
+    # Eight identical requests arriving together: rendered once, the rest join the same job
+    from report_service import ReportService
+    from timeseries_store import TimeSeriesStore
+    directory = tempfile.mkdtemp(prefix='benchmark-reports-')
+    store = TimeSeriesStore(os.path.join(directory, 'store.sqlite'))
+    store.write('BENCH', synthetic_clean_data(rows))
+    service = ReportService(store, workers=2, cache_dir=directory)
+
+    def run():
+        for name in os.listdir(directory):
+            if name.endswith('.pdf'):
+                os.remove(os.path.join(directory, name))
+        jobs = [service.submit('BENCH', mode='fast') for _ in range(8)]
+        for job in jobs:
+            service.wait(job)
+    return run
+
+
+@benchmark('dashboard.update_charts', max_rows=1_000_000)
+def bench_update_charts(rows):
+    import app
+    df = synthetic_clean_data(rows)
+    app.snapshots.publish(df)
+    start, end = str(df.index[len(df) // 4].date()), str(df.index[3 * len(df) // 4].date())
+
+    def run():
+        # Cold path: what a new date range costs, so clear the memoized figures first
+        for builder in app.LOCAL_CACHES:
+            builder.cache_clear()
+        app.shared_cache.clear()
+        app.frame_store = app.FrameStore(max_entries=app.FIGURE_CACHE_SIZE)
+        data_key = app.update_filtered_data(app.DASHBOARD_SYMBOL, start, end)
+        app.update_metric_cards(data_key)
+        app.update_trend_chart(data_key, None, None)
+        app.update_roas_chart(data_key, None)
+        app.update_correlation_chart(data_key, None)
+        app.update_returns_chart(data_key, None)
+    return run
+
+
+@benchmark('dashboard.update_charts_shared_hit', max_rows=1_000_000)
+def bench_update_charts_shared_hit(rows):
+    import app
+    df = synthetic_clean_data(rows)
+    app.snapshots.publish(df)
+    start, end = str(df.index[len(df) // 4].date()), str(df.index[3 * len(df) // 4].date())
+
+    def run():
+        # Another worker already built these figures: only the local caches are cold
+        for builder in app.LOCAL_CACHES:
+            builder.cache_clear()
+        data_key = app.update_filtered_data(app.DASHBOARD_SYMBOL, start, end)
+        app.update_metric_cards(data_key)
+        app.update_trend_chart(data_key, None, None)
+        app.update_roas_chart(data_key, None)
+        app.update_correlation_chart(data_key, None)
+        app.update_returns_chart(data_key, None)
+    return run
+
+
+def time_callable(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def current_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def run_benchmarks(scales=DEFAULT_SCALES, name_filter=None, repeat=3):
+    results = []
+    for name, (setup, max_rows) in BENCHMARKS.items():
+        if name_filter and name_filter not in name:
+            continue
+        for rows in scales:
+            if max_rows is not None and rows > max_rows:
+                continue
+            func = setup(rows)
+            func()  # Warm-up (imports, caches)
+            timings = time_callable(func, repeat)
+            results.append({'name': name, 'rows': rows, 'min_seconds': min(timings),
+                            'mean_seconds': sum(timings) / len(timings), 'repeat': repeat})
+            print(f"{name:<28} {rows:>12,} rows  min {min(timings):9.4f}s  mean {results[-1]['mean_seconds']:9.4f}s")
+    return results
+
+
+def save_results(results, commit=None):
+    commit = commit or current_commit()
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"{commit}.json")
+    payload = {
+        'commit': commit,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'results': results,
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, indent=2)
+    return path
+
+
+def compare(commit_a, commit_b):
+    """Prints the min-time ratio of commit_b over commit_a for every shared benchmark"""
+    def load(commit):
+        with open(os.path.join(RESULTS_DIR, f"{commit}.json"), encoding='utf-8') as f:
+            return {(r['name'], r['rows']): r['min_seconds'] for r in json.load(f)['results']}
+    a, b = load(commit_a), load(commit_b)
+    print(f"{'benchmark':<28} {'rows':>12}  {commit_a:>10}  {commit_b:>10}  ratio")
+    for key in sorted(set(a) & set(b)):
+        ratio = b[key] / a[key] if a[key] else float('nan')
+        flag = '  <- slower' if ratio > 1.1 else ''
+        print(f"{key[0]:<28} {key[1]:>12,}  {a[key]:9.4f}s  {b[key]:9.4f}s  {ratio:5.2f}{flag}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the offline pipeline benchmarks")
+    parser.add_argument('--scales', nargs='+', type=int, default=list(DEFAULT_SCALES),
+                        help="Row counts to benchmark at (e.g. 1000 1000000 100000000)")
+    parser.add_argument('--filter', help="Only run benchmarks whose name contains this string")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--compare', nargs=2, metavar=('COMMIT_A', 'COMMIT_B'),
+                        help="Compare two stored result files instead of running")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        sys.exit()
+    results = run_benchmarks(args.scales, args.filter, args.repeat)
+    print(f"Results written to {save_results(results)}")
@@ -0,0 +1,55 @@
+# benchmarks/synthetic.py
+import numpy as np
+import pandas as pd
+
+# Campaign names the cleaning step has cost factors for; extra campaigns get numbered names
+KNOWN_CAMPAIGNS = ['setosa', 'versicolor', 'virginica']
+
+
+def _dates(rows, freq=None):
+    # Business days are realistic but run out of calendar past ~60k rows, so use minutes there
+    freq = freq or ('B' if rows <= 60_000 else 'min')
+    return pd.date_range('2000-01-03', periods=rows, freq=freq)
+
+
+def synthetic_stock_data(rows, seed=0, freq=None):
+    """Same schema as get_stock_data(): float open/high/low/close/volume on a sorted DatetimeIndex"""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, rows)))
+    spread = np.abs(rng.normal(0, 0.5, rows))
+    return pd.DataFrame({
+        'open': close + rng.normal(0, 0.3, rows),
+        'high': close + spread,
+        'low': close - spread,
+        'close': close,
+        'volume': rng.integers(1_000_000, 9_000_000, rows).astype(float),
+    }, index=_dates(rows, freq))
+
+
+def synthetic_stock_data_many(rows_per_symbol, symbols=10, seed=0):
+    """Same schema as get_stock_data_many(): a (symbol, date) MultiIndex"""
+    frames = {f"SYM{i:04d}": synthetic_stock_data(rows_per_symbol, seed=seed + i) for i in range(symbols)}
+    return pd.concat(frames, names=['symbol', 'date'])
+
+
+def synthetic_marketing_data(rows, campaigns=3, seed=0, freq=None):
+    """Same schema as get_marketing_data(stock_dates=...): marketing metrics on a date index"""
+    rng = np.random.default_rng(seed)
+    names = KNOWN_CAMPAIGNS[:campaigns] + [f"campaign_{i:03d}" for i in range(len(KNOWN_CAMPAIGNS), campaigns)]
+    df = pd.DataFrame({
+        'daily_visitors': rng.uniform(4.3, 7.9, rows),
+        'click_through_rate': rng.uniform(2.0, 4.4, rows),
+        'conversion_rate': rng.uniform(1.0, 6.9, rows),
+        'avg_order_value': rng.uniform(0.1, 2.5, rows),
+        'campaign_id': np.array(names, dtype=object)[rng.integers(0, len(names), rows)],
+    }, index=_dates(rows, freq))
+    df.index.name = 'date'
+    return df
+
+
+def synthetic_clean_data(rows, campaigns=3, seed=0):
+    """Same schema as get_clean_data(), built offline from the synthetic sources"""
+    from data_cleaning import clean_and_transform_Stock_data, clean_and_transform_marketing_data, merge_datasets
+    stock = clean_and_transform_Stock_data(synthetic_stock_data(rows, seed=seed))
+    marketing = clean_and_transform_marketing_data(synthetic_marketing_data(rows, campaigns, seed=seed))
+    return merge_datasets(stock, marketing)
@@ -0,0 +1,51 @@
+# dashboard_store.py
+import threading
+from collections import OrderedDict
+
+
+class FrameStore:
+    """
+    Bounded, thread-safe LRU of filtered DataFrames kept on the server.
+    Callbacks exchange only the short string key through a dcc.Store, so the
+    rows themselves never travel to the browser. Keys are deterministic, so a
+    worker that has not seen a key yet can rebuild the entry with a factory.
+    """
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._frames = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            frame = self._frames.get(key)
+            if frame is not None:
+                self._frames.move_to_end(key)
+            return frame
+
+    def put(self, key, frame):
+        with self._lock:
+            self._frames[key] = frame
+            self._frames.move_to_end(key)
+            while len(self._frames) > self.max_entries:
+                self._frames.popitem(last=False)
+
+    def get_or_create(self, key, factory):
+        frame = self.get(key)
+        if frame is None:
+            frame = factory()
+            self.put(key, frame)
+        return frame
+
+    def __len__(self):
+        return len(self._frames)
+
+
+def make_key(symbol, version, start_row, end_row):
+    """Store key for rows [start_row, end_row) of a symbol's data version"""
+    return f"{symbol}:{version}:{start_row}:{end_row}"
+
+
+def parse_key(key):
+    symbol, version, start_row, end_row = key.rsplit(':', 3)
+    return symbol, version, int(start_row), int(end_row)
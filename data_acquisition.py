@@ -1,38 +1,251 @@
+import numpy as np
 import pandas as pd
 import requests
 import os
+import time
+import random
+import asyncio
+from requests.adapters import HTTPAdapter
+from data_cache import load_frame, save_frame, cache_entry, is_fresh
+from instrumentation import instrument
 
 ALPHA_VANTAGE_API_KEY = os.getenv('ALPHA_VANTAGE_API_KEY')
+ALPHA_VANTAGE_BASE_URL = os.getenv('ALPHA_VANTAGE_BASE_URL', 'https://www.alphavantage.co/query')
+# Free tier quota; raise this for premium keys
+ALPHA_VANTAGE_CALLS_PER_MINUTE = int(os.getenv('ALPHA_VANTAGE_CALLS_PER_MINUTE', 5))
+MAX_CONCURRENT_REQUESTS = 8
+STOCK_FUNCTION = 'TIME_SERIES_DAILY'
 
-def get_stock_data(symbol="IBM"):
-    """Fetches daily time series data for a stock from Alpha Vantage"""
-    url = f"https://www.alphavantage.co/query?function=TIME_SERIES_DAILY&symbol={symbol}&apikey={ALPHA_VANTAGE_API_KEY}"
+# One pooled session so repeated calls reuse keep-alive connections
+_session = requests.Session()
+_session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=MAX_CONCURRENT_REQUESTS))
+_session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=MAX_CONCURRENT_REQUESTS))
+
+STOCK_HISTORY = 'TIME_SERIES_DAILY_HISTORY'
+
+# Concurrent fetches use aiohttp when it is installed; without it each request runs the
+# blocking requests session on a worker thread
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+def _parse_time_series(data):
+    """Converts an Alpha Vantage daily time series payload into a sorted float DataFrame"""
+    # the actual time series is nested in this key
+    time_series = data["Time Series (Daily)"]
+    # Convert into a dataframe and clean it up
+
+    df = pd.DataFrame.from_dict(time_series, orient='index')
+    df = df.rename(columns={
+        '1. open': 'open',
+        '2. high': 'high',
+        '3. low': 'low',
+        '4. close': 'close',
+        '5. volume': 'volume'
+    })
+
+    df.index = pd.to_datetime(df.index)
+    df = df.astype(float)
+    df = df.sort_index()
+    return df
+
+class RateLimitError(Exception):
+    """Raised when Alpha Vantage answers with its quota notice instead of data"""
+
+# Errors worth retrying: network failures, bad statuses and quota notices
+RETRYABLE_ERRORS = (requests.exceptions.RequestException, RateLimitError)
+if aiohttp is not None:
+    RETRYABLE_ERRORS += (aiohttp.ClientError, asyncio.TimeoutError)
+
+def _time_series_params(symbol, outputsize):
+    params = {
+        'function': STOCK_FUNCTION,
+        'symbol': symbol,
+        'outputsize': outputsize,
+        'apikey': ALPHA_VANTAGE_API_KEY,
+    }
+    return {key: value for key, value in params.items() if value is not None}
+
+def _check_quota(data):
+    # Quota notices come back as HTTP 200 with a "Note"/"Information" message
+    if "Time Series (Daily)" not in data and ("Note" in data or "Information" in data):
+        raise RateLimitError(data.get("Note") or data.get("Information"))
+    return data
+
+def _request_time_series(symbol, outputsize="compact", base_url=None):
+    response = _session.get(base_url or ALPHA_VANTAGE_BASE_URL, params=_time_series_params(symbol, outputsize),
+                            timeout=30)
+    response.raise_for_status() #raises an error for bad status codes
+    return _check_quota(response.json())
+
+async def _request_time_series_async(session, symbol, outputsize="compact", base_url=None):
+    """Non-blocking request on a shared aiohttp session, or the blocking one on a thread without it"""
+    if session is None:
+        return await asyncio.to_thread(_request_time_series, symbol, outputsize, base_url)
+    async with session.get(base_url or ALPHA_VANTAGE_BASE_URL, params=_time_series_params(symbol, outputsize)) as response:
+        response.raise_for_status()
+        return _check_quota(await response.json(content_type=None))
+
+def _fetch_time_series(symbol, outputsize="compact", base_url=None):
+    return _parse_time_series(_request_time_series(symbol, outputsize, base_url))
+
+@instrument()
+def get_stock_data(symbol="IBM", use_cache=True, force_refresh=False, incremental=False):
+    """Fetches daily time series data for a stock from Alpha Vantage.
+    Parsed series are cached on disk; pass force_refresh=True to bypass a fresh cache entry.
+    With incremental=True a local history is kept per symbol and only new trading days are appended.
+    """
+    if incremental:
+        return update_stock_history(symbol, force_refresh=force_refresh)
+
+    if use_cache and not force_refresh:
+        cached = load_frame(STOCK_FUNCTION, symbol)
+        if cached is not None:
+            print(f"Loaded {len(cached)} days of data for {symbol} from cache")
+            return cached
 
     try:
-        response = requests.get(url)
-        response.raise_for_status() #raises an error for bad status codes
-        data = response.json()
-        # the actual time series is nested in this key
-        time_series = data["Time Series (Daily)"]
-        # Convert into a dataframe and clean it up
-
-        df = pd.DataFrame.from_dict(time_series, orient='index')
-        df = df.rename(columns={
-            '1. open': 'open',
-            '2. high': 'high',
-            '3. low': 'low',
-            '4. close': 'close',
-            '5. volume': 'volume'
-        })
-
-        df.index = pd.to_datetime(df.index)
-        df = df.astype(float)
-        df = df.sort_index()
+        df = _fetch_time_series(symbol)
         print(f"Successfully fetched {len(df)} days of data for {symbol}")
+        if use_cache:
+            save_frame(STOCK_FUNCTION, symbol, df)
         return df
-    except requests.exceptions.RequestException as e:
+    except (requests.exceptions.RequestException, RateLimitError) as e:
         print(f"Error fetching data: {e}")
+        # Serve an expired cache entry rather than nothing when the API is unavailable
+        stale = load_frame(STOCK_FUNCTION, symbol, allow_stale=True) if use_cache else None
+        if stale is not None:
+            print(f"Using stale cached data for {symbol}")
+            return stale
         return pd.DataFrame() # Return an empty DataFrame on error
+
+def update_stock_history(symbol="IBM", force_refresh=False):
+    """Appends trading days newer than the stored history for a symbol.
+    Only the compact (last 100 days) window is requested once a history exists;
+    rows already stored are never rewritten. The history is pinned in the cache,
+    so LRU eviction never forces a full download.
+    """
+    history = load_frame(STOCK_HISTORY, symbol, allow_stale=True)
+    if history is not None and not force_refresh and is_fresh(cache_entry(STOCK_HISTORY, symbol) or {}):
+        print(f"Loaded {len(history)} days of history for {symbol} from cache")
+        return history
+
+    try:
+        if history is None or history.empty:
+            df = _fetch_time_series(symbol, outputsize="full")
+            print(f"Successfully fetched {len(df)} days of history for {symbol}")
+        else:
+            latest = _fetch_time_series(symbol, outputsize="compact")
+            last_stored = history.index.max()
+            if latest.index.min() > last_stored + pd.offsets.BDay(1):
+                # Trading days are missing between the history and the compact window: refetch in full
+                latest = _fetch_time_series(symbol, outputsize="full")
+            new_rows = latest[latest.index > last_stored]
+            df = pd.concat([history, new_rows]) if not new_rows.empty else history
+            print(f"Appended {len(new_rows)} new days of data for {symbol}")
+        save_frame(STOCK_HISTORY, symbol, df, pinned=True)
+        return df
+    except (requests.exceptions.RequestException, RateLimitError) as e:
+        print(f"Error fetching data: {e}")
+        if history is not None:
+            print(f"Using stored history for {symbol}")
+            return history
+        return pd.DataFrame()
+
+class TokenBucket:
+    """Async token bucket allowing `rate` requests per `per` seconds, with bursts up to `capacity`."""
+
+    def __init__(self, rate, per=60.0, capacity=None):
+        self.fill_rate = rate / per
+        self.capacity = capacity if capacity is not None else rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        # Take a token now, going into debt when the bucket is empty, and sleep off the debt
+        # outside the lock: waiters queue up in order without blocking each other
+        async with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.fill_rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.fill_rate if self.tokens < 0 else 0.0
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+async def _fetch_symbol(symbol, session, bucket, semaphore, max_retries, backoff_seconds, base_url):
+    for attempt in range(max_retries + 1):
+        await bucket.acquire()
+        try:
+            async with semaphore:
+                data = await _request_time_series_async(session, symbol, "compact", base_url)
+            return symbol, _parse_time_series(data)
+        except RETRYABLE_ERRORS as e:
+            if attempt == max_retries:
+                print(f"Error fetching data for {symbol} after {attempt + 1} attempts: {e}")
+                return symbol, pd.DataFrame()
+            # Exponential backoff with jitter so retries don't arrive in lockstep
+            delay = backoff_seconds * (2 ** attempt) + random.uniform(0, backoff_seconds)
+            await asyncio.sleep(delay)
+        except (KeyError, ValueError) as e:
+            # Unknown symbol or malformed payload: retrying won't help
+            print(f"Error parsing data for {symbol}: {e}")
+            return symbol, pd.DataFrame()
+
+async def get_stock_data_many_async(symbols, use_cache=True, force_refresh=False,
+                                    calls_per_minute=None, max_concurrency=MAX_CONCURRENT_REQUESTS,
+                                    max_retries=3, backoff_seconds=1.0, base_url=None):
+    """Async version of get_stock_data_many, for callers that already run an event loop.
+    Requests share one aiohttp session (a connection pool of max_concurrency) when aiohttp
+    is installed, and are otherwise run on threads with the blocking requests session.
+    """
+    frames = {}
+    pending = []
+    for symbol in dict.fromkeys(symbols):
+        cached = load_frame(STOCK_FUNCTION, symbol) if use_cache and not force_refresh else None
+        if cached is not None:
+            frames[symbol] = cached
+        else:
+            pending.append(symbol)
+    print(f"{len(frames)} symbols served from cache, fetching {len(pending)}")
+
+    bucket = TokenBucket(calls_per_minute or ALPHA_VANTAGE_CALLS_PER_MINUTE)
+    semaphore = asyncio.Semaphore(max_concurrency)
+    session = None
+    if aiohttp is not None and pending:
+        session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=max_concurrency),
+                                        timeout=aiohttp.ClientTimeout(total=30))
+    try:
+        results = await asyncio.gather(*[
+            _fetch_symbol(symbol, session, bucket, semaphore, max_retries, backoff_seconds, base_url)
+            for symbol in pending
+        ])
+    finally:
+        if session is not None:
+            await session.close()
+    for symbol, df in results:
+        if df.empty:
+            continue
+        if use_cache:
+            save_frame(STOCK_FUNCTION, symbol, df)
+        frames[symbol] = df
+
+    if not frames:
+        return pd.DataFrame()
+    # Long format: one row per (symbol, date)
+    combined = pd.concat(frames, names=['symbol', 'date'])
+    print(f"Successfully fetched {len(frames)} of {len(dict.fromkeys(symbols))} symbols")
+    return combined
+
+@instrument()
+def get_stock_data_many(symbols, **kwargs):
+    """Fetches daily series for many symbols concurrently, within the provider's per-minute quota.
+    Returns one DataFrame with a (symbol, date) MultiIndex; failed symbols are left out.
+    Pass base_url to point at a different endpoint (e.g. a local stub server).
+    """
+    return asyncio.run(get_stock_data_many_async(symbols, **kwargs))
     
 # Test the function
 if __name__=="__main__":
@@ -40,45 +253,141 @@ if __name__=="__main__":
     print(stock_df.head()) 
 
 # data_acquisition.py (update the get_marketing_data function)
-def get_marketing_data(stock_dates=None):
+@instrument()
+def get_marketing_data(stock_dates=None, source=None, policy=None):
     """Fetches mock marketing data from a web URL.
-    If stock_dates is provided, generates marketing data for the same period.
+    If stock_dates is provided, the rows are aligned to those trading days (see align_marketing_dates).
+    Pass an already fetched source (from fetch_marketing_source) to skip the download.
     """
-    # Using a public dataset URL for reliability
-    url = "https://raw.githubusercontent.com/mwaskom/seaborn-data/master/iris.csv"
     try:
-        df = pd.read_csv(url)
+        df = source if source is not None else fetch_marketing_source()
+        return align_marketing_dates(df, stock_dates, policy=policy)
+    except Exception as e:
+        print(f"Error fetching marketing data: {e}")
+        return pd.DataFrame()
+
+# Using a public dataset URL for reliability
+MARKETING_URL = "https://raw.githubusercontent.com/mwaskom/seaborn-data/master/iris.csv"
+MARKETING_SOURCE = 'MARKETING_SOURCE'
+# Rename columns to make it seem like marketing data for our project
+MARKETING_COLUMNS = {
+    'sepal_length': 'daily_visitors',
+    'sepal_width': 'click_through_rate',
+    'petal_length': 'conversion_rate',
+    'petal_width': 'avg_order_value',
+    'species': 'campaign_id'
+}
+
+# How marketing rows are mapped onto trading days:
+#   aggregate  rows dated on a non-trading day roll forward to the next trading day and are
+#              combined per (day, campaign) with MARKETING_AGGREGATIONS, so no row is lost
+#   ffill      each trading day takes the latest rows dated on or before it (as-of join),
+#              for sources sparser than the trading calendar
+ALIGN_POLICIES = ('aggregate', 'ffill')
+DEFAULT_ALIGN_POLICY = os.getenv('MARKETING_ALIGN_POLICY', 'aggregate')
+# Counts add up over the rolled-up days, rates and values are averaged
+MARKETING_AGGREGATIONS = {
+    'daily_visitors': 'sum',
+    'click_through_rate': 'mean',
+    'conversion_rate': 'mean',
+    'avg_order_value': 'mean',
+}
+# ffill never carries a row further than this past its own date
+FFILL_TOLERANCE = pd.Timedelta(days=7)
+# Start of the fallback calendar when no stock dates are given
+DEFAULT_MARKETING_START = '2023-01-01'
+
+_marketing_source = None
+
+def fetch_marketing_source(use_cache=True, force_refresh=False):
+    """Downloads the raw marketing rows (without dates).
+    The rows are kept for the life of the process and in the data cache, so the
+    CSV is downloaded at most once per cache period however many symbols are built.
+    Treat the returned frame as read-only.
+    """
+    global _marketing_source
+    if use_cache and not force_refresh:
+        if _marketing_source is not None:
+            return _marketing_source
+        cached = load_frame(MARKETING_SOURCE, 'iris')
+        if cached is not None:
+            _marketing_source = cached
+            return cached
+
+    try:
+        df = pd.read_csv(MARKETING_URL)
+    except Exception:
+        stale = load_frame(MARKETING_SOURCE, 'iris', allow_stale=True) if use_cache else None
+        if stale is None:
+            raise
+        print("Using stale cached marketing data")
+        df = stale
+    else:
         print("Successfully fetched marketing data.")
+        df = df.rename(columns=MARKETING_COLUMNS)
+        if use_cache:
+            save_frame(MARKETING_SOURCE, 'iris', df)
+    if use_cache:
+        _marketing_source = df
+    return df
 
-        # Rename columns to make it seem like marketing data for our project
-        df = df.rename(columns={
-            'sepal_length': 'daily_visitors',
-            'sepal_width': 'click_through_rate',
-            'petal_length': 'conversion_rate',
-            'petal_width': 'avg_order_value',
-            'species': 'campaign_id'
-        })
-
-        # --- CRITICAL FIX: Align dates with stock data ---
-        if stock_dates is not None:
-            # Generate dates matching the stock data's date range and length
-            num_days = len(stock_dates)
-            # If we have more marketing data rows than stock days, trim it.
-            df = df.head(num_days)
-            # Create a date index starting from the first stock date
-            dates = pd.date_range(start=stock_dates.min(), periods=len(df), freq='D')
-        else:
-            # Fallback: use the old method if no stock_dates are provided
-            dates = pd.date_range(start='2023-01-01', periods=len(df), freq='D')
+def _source_dates(df, start):
+    """Dates of the marketing rows: their own dates if they have any, else one calendar day per row from start"""
+    if isinstance(df.index, pd.DatetimeIndex):
+        return df.reset_index(drop=True), df.index.to_numpy()
+    if 'date' in df.columns:
+        return df.drop(columns='date'), pd.to_datetime(df['date']).to_numpy()
+    return df, pd.date_range(start=start, periods=len(df), freq='D').to_numpy()
 
-        df['date'] = dates
-        df.set_index('date', inplace=True)
-        
+def align_marketing_dates(df, stock_dates=None, policy=None):
+    """Gives the marketing rows a date index on the stock data's trading calendar.
+    Every marketing date is located among the trading days with one vectorized
+    searchsorted, and the rows are then aggregated or forward-filled (see ALIGN_POLICIES).
+    The result only holds trading days, so merge_datasets(..., aligned=True) keeps all of it.
+    """
+    policy = policy or DEFAULT_ALIGN_POLICY
+    if policy not in ALIGN_POLICIES:
+        raise ValueError(f"Unknown alignment policy {policy!r}; expected one of {ALIGN_POLICIES}")
 
+    if stock_dates is None or len(stock_dates) == 0:
+        # Fallback: one calendar day per row, as before
+        df, dates = _source_dates(df, DEFAULT_MARKETING_START)
+        df = df.copy()
+        df.index = pd.DatetimeIndex(dates, name='date')
         return df
-    except Exception as e:
-        print(f"Error fetching marketing data: {e}")
-        return pd.DataFrame()
+
+    trading = np.unique(pd.DatetimeIndex(stock_dates).to_numpy())
+    df, dates = _source_dates(df, trading[0])
+    order = np.argsort(dates, kind='stable')
+    df, dates = df.iloc[order], dates[order]
+
+    if policy == 'aggregate':
+        target = np.searchsorted(trading, dates, side='left')
+        keep = (dates >= trading[0]) & (target < len(trading))
+        rows = df.iloc[np.flatnonzero(keep)].copy()
+        rows.index = pd.DatetimeIndex(trading[target[keep]], name='date')
+        keys = ['date', 'campaign_id'] if 'campaign_id' in rows.columns else ['date']
+        aggregations = {col: MARKETING_AGGREGATIONS.get(col, 'mean' if pd.api.types.is_numeric_dtype(rows[col]) else 'last')
+                        for col in rows.columns if col not in keys}
+        aligned = rows.groupby(keys, sort=True, observed=True).agg(aggregations)
+        if 'campaign_id' in keys:
+            aligned = aligned.reset_index('campaign_id')
+        return aligned[[col for col in df.columns if col in aligned.columns]]
+
+    # ffill: as-of join of the trading days against the distinct marketing dates
+    unique_dates, first_rows = np.unique(dates, return_index=True)
+    row_counts = np.diff(np.append(first_rows, len(dates)))
+    latest = np.searchsorted(unique_dates, trading, side='right') - 1
+    valid = latest >= 0
+    valid[valid] = trading[valid] - unique_dates[latest[valid]] <= FFILL_TOLERANCE.to_timedelta64()
+    picked = latest[valid]
+    # Expand each trading day to all rows of the date it takes
+    counts = row_counts[picked]
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    positions = np.repeat(first_rows[picked], counts) + offsets
+    aligned = df.iloc[positions].copy()
+    aligned.index = pd.DatetimeIndex(np.repeat(trading[valid], counts), name='date')
+    return aligned
     
 #testing the function
 
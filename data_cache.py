@@ -0,0 +1,255 @@
+# data_cache.py
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+import pandas as pd
+
+# Where cached API responses live and how long they stay valid
+CACHE_DIR = os.getenv('DATA_CACHE_DIR', 'cache')
+CACHE_TTL_SECONDS = int(os.getenv('DATA_CACHE_TTL_SECONDS', 12 * 60 * 60))
+CACHE_MAX_BYTES = int(os.getenv('DATA_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+
+# US equity market close, used to expire daily series once a new bar is available
+MARKET_TIMEZONE = 'America/New_York'
+MARKET_CLOSE_HOUR = 16
+
+INDEX_FILE = 'index.json'
+# Cache hits only rewrite the index when the recorded access is older than this
+ACCESS_RESOLUTION_SECONDS = 60
+
+# Parquet needs pyarrow; fall back to pickle so the cache still works without it
+try:
+    import pyarrow  # noqa: F401
+    CACHE_FORMAT = 'parquet'
+except ImportError:
+    CACHE_FORMAT = 'pickle'
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # Not available on Windows: the index is only locked within a process
+
+_index_thread_lock = threading.Lock()
+
+
+def _cache_key(function, symbol):
+    return f"{function}_{symbol}".upper().replace('/', '_')
+
+
+def _cache_path(key):
+    extension = 'parquet' if CACHE_FORMAT == 'parquet' else 'pkl'
+    return os.path.join(CACHE_DIR, f"{key}.{extension}")
+
+
+def _read_index():
+    path = os.path.join(CACHE_DIR, INDEX_FILE)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_index(index):
+    # Write to a temp file and rename so concurrent readers never see a partial index
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(index, f)
+    os.replace(tmp_path, os.path.join(CACHE_DIR, INDEX_FILE))
+
+
+@contextmanager
+def _locked_index():
+    """
+    Yields the index for a read-modify-write. Threads and processes sharing the cache
+    take turns (flock on a sidecar file), so concurrent updates don't drop entries.
+    """
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with _index_thread_lock:
+        if fcntl is None:
+            yield _read_index()
+            return
+        with open(os.path.join(CACHE_DIR, INDEX_FILE + '.lock'), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)  # Released when the file is closed
+            yield _read_index()
+
+
+def temp_path(path):
+    """A unique temp file next to path, for writes that are renamed into place"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+    os.close(fd)
+    return tmp_path
+
+
+def last_market_close(now=None):
+    """Returns the most recent weekday market close (as a UTC timestamp) at or before now."""
+    try:
+        from zoneinfo import ZoneInfo
+        tz = ZoneInfo(MARKET_TIMEZONE)
+    except Exception:
+        tz = timezone.utc  # No tz database available: approximate the close in UTC
+
+    now = datetime.fromtimestamp(now if now is not None else time.time(), tz)
+    close = now.replace(hour=MARKET_CLOSE_HOUR, minute=0, second=0, microsecond=0)
+    if close > now:
+        close -= timedelta(days=1)
+    # Skip back over weekends (exchange holidays are not modelled)
+    while close.weekday() >= 5:
+        close -= timedelta(days=1)
+    return close.timestamp()
+
+
+def is_fresh(entry, now=None, ttl_seconds=CACHE_TTL_SECONDS):
+    """An entry is fresh if it is within the TTL and no market close has happened since it was fetched."""
+    now = now if now is not None else time.time()
+    fetched_at = entry.get('fetched_at', 0)
+    if now - fetched_at > ttl_seconds:
+        return False
+    return fetched_at >= last_market_close(now)
+
+
+def load_frame(function, symbol, allow_stale=False, ttl_seconds=CACHE_TTL_SECONDS):
+    """Returns the cached DataFrame for (function, symbol), or None on a miss or expired entry."""
+    key = _cache_key(function, symbol)
+    entry = _read_index().get(key)
+    path = _cache_path(key)
+    if entry is None or not os.path.exists(path):
+        return None
+    if not allow_stale and not is_fresh(entry, ttl_seconds=ttl_seconds):
+        return None
+
+    try:
+        if CACHE_FORMAT == 'parquet':
+            df = pd.read_parquet(path)
+        else:
+            df = pd.read_pickle(path)
+    except Exception as e:
+        print(f"Error reading cache entry {key}: {e}")
+        return None
+
+    _record_access(key, entry)
+    return df
+
+
+def cache_entry(function, symbol):
+    """Returns the index entry for (function, symbol), or None if it isn't cached"""
+    return _read_index().get(_cache_key(function, symbol))
+
+
+def save_frame(function, symbol, df, max_bytes=CACHE_MAX_BYTES, pinned=False):
+    """
+    Stores a DataFrame in the cache and evicts least recently used entries over the size cap.
+    Pinned entries (e.g. accumulated histories that can't be cheaply refetched) are never
+    evicted and don't count towards the cap.
+    """
+    key = _cache_key(function, symbol)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = _cache_path(key)
+    tmp_path = temp_path(path)
+    if CACHE_FORMAT == 'parquet':
+        df.to_parquet(tmp_path)
+    else:
+        df.to_pickle(tmp_path)
+    os.replace(tmp_path, path)
+
+    now = time.time()
+    with _locked_index() as index:
+        index[key] = {
+            'path': os.path.basename(path),
+            'fetched_at': now,
+            'last_access': now,
+            'size': os.path.getsize(path),
+        }
+        if pinned:
+            index[key]['pinned'] = True
+        _evict(index, max_bytes, keep=key)
+        _write_index(index)
+
+
+def record_file(path, max_bytes=CACHE_MAX_BYTES):
+    """
+    Adds a file written under CACHE_DIR (e.g. a rendered chart) to the cache index, so it
+    shares the size cap and LRU eviction of the cached frames.
+    """
+    key = os.path.relpath(path, CACHE_DIR)
+    now = time.time()
+    with _locked_index() as index:
+        index[key] = {'path': key, 'fetched_at': now, 'last_access': now, 'size': os.path.getsize(path)}
+        _evict(index, max_bytes, keep=key)
+        _write_index(index)
+
+
+def touch_file(path):
+    """Records an access to a file added with record_file, for LRU eviction"""
+    key = os.path.relpath(path, CACHE_DIR)
+    entry = _read_index().get(key)
+    if entry is not None:
+        _record_access(key, entry)
+
+
+def _record_access(key, entry):
+    # Record the access for LRU eviction. Hits within ACCESS_RESOLUTION_SECONDS of the last
+    # recorded one are skipped, so frequent hits don't rewrite the whole index each time.
+    now = time.time()
+    if now - entry.get('last_access', 0) < ACCESS_RESOLUTION_SECONDS:
+        return
+    with _locked_index() as index:
+        if key in index:
+            index[key]['last_access'] = now
+            _write_index(index)
+
+
+def _evict(index, max_bytes, keep=None):
+    evictable = {key: entry for key, entry in index.items() if not entry.get('pinned')}
+    total = sum(entry.get('size', 0) for entry in evictable.values())
+    # Oldest access first; the entry just written (keep) is never evicted
+    for key, entry in sorted(evictable.items(), key=lambda item: item[1].get('last_access', 0)):
+        if total <= max_bytes:
+            break
+        if key == keep:
+            continue
+        try:
+            os.remove(os.path.join(CACHE_DIR, entry['path']))
+        except OSError:
+            pass
+        total -= entry.get('size', 0)
+        del index[key]
+        print(f"Evicted cache entry {key}")
+
+
+def frame_version(df):
+    """Short content hash of a DataFrame (values and index), used to key derived caches"""
+    if df.empty:
+        return 'empty'
+    row_hashes = pd.util.hash_pandas_object(df, index=True).to_numpy()
+    digest = hashlib.sha1(row_hashes.tobytes())
+    digest.update(','.join(map(str, df.columns)).encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+def invalidate(function=None, symbol=None):
+    """Removes cache entries matching the given function and/or symbol (all entries if neither is given)."""
+    prefix = _cache_key(function, '') if function else ''
+    suffix = f"_{symbol}".upper() if symbol else ''
+    with _locked_index() as index:
+        for key in list(index):
+            if key.startswith(prefix) and key.endswith(suffix):
+                try:
+                    os.remove(os.path.join(CACHE_DIR, index[key]['path']))
+                except OSError:
+                    pass
+                del index[key]
+        _write_index(index)
+
+
+# Test the cache
+if __name__ == "__main__":
+    print(f"Cache format: {CACHE_FORMAT}, directory: {CACHE_DIR}")
+    print(f"Last market close: {datetime.fromtimestamp(last_market_close())}")
+    print(json.dumps(_read_index(), indent=2))
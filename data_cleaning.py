@@ -1,22 +1,42 @@
 import pandas as pd
 import numpy as np
-from data_acquisition import get_stock_data, get_marketing_data
+from data_acquisition import get_stock_data, get_marketing_data, get_stock_data_many, fetch_marketing_source
+from data_cache import load_frame, save_frame
+from instrumentation import instrument
 
-def clean_and_transform_Stock_data(stock_df):
+MOVING_AVG_WINDOW = 7
+CLEAN_STOCK_HISTORY = 'CLEAN_STOCK_HISTORY'
+
+# Compact dtypes used by the optimized pipeline
+STOCK_DTYPES = {'open': 'float32', 'high': 'float32', 'low': 'float32', 'close': 'float32', 'volume': 'int64'}
+MARKETING_DTYPES = {'daily_visitors': 'float32', 'click_through_rate': 'float32',
+                    'conversion_rate': 'float32', 'avg_order_value': 'float32', 'campaign_id': 'category'}
+
+@instrument()
+def clean_and_transform_Stock_data(stock_df, previous_clean=None, optimized=False):
     """
     Cleans the stock DataFrame and ads calculated financial metrics.
+    If previous_clean is given, only rows newer than it are transformed and appended.
+    With optimized=True prices are stored as float32 and volume as int64, and no defensive copy is made.
     """
     if stock_df.empty:
         return stock_df
+
+    if previous_clean is not None and not previous_clean.empty:
+        return extend_clean_stock_data(stock_df, previous_clean)
     
-    # Make a copy to avoid modifying the original
-    df = stock_df.copy()
+    if optimized:
+        # The dtype conversion already produces a new frame, so the original is untouched
+        df = stock_df.astype({col: dtype for col, dtype in STOCK_DTYPES.items() if col in stock_df.columns})
+    else:
+        # Make a copy to avoid modifying the original
+        df = stock_df.copy()
 
     # 1. Calculate daily percentage return (a key KPI)
     df['daily_return'] = df['close'].pct_change() * 100
 
     # 2. Calculate a 7-day moving average of the closing price (to identidy trends)
-    df['moving_avg_7d'] = df['close'].rolling(window=7).mean()
+    df['moving_avg_7d'] = df['close'].rolling(window=MOVING_AVG_WINDOW).mean()
 
     # 3. Drop the first 6 rows which now have NaN due to the moving averasge calculation
     df = df.dropna()
@@ -24,6 +44,28 @@ def clean_and_transform_Stock_data(stock_df):
     print("Stock data cleaned and transformed")
     return df
 
+def extend_clean_stock_data(stock_df, previous_clean):
+    """
+    Computes daily_return and moving_avg_7d only for the tail of stock_df that is newer
+    than previous_clean, and appends it. Existing cleaned rows are left untouched.
+    """
+    last_clean = previous_clean.index.max()
+    new_mask = stock_df.index > last_clean
+    if not new_mask.any():
+        return previous_clean
+
+    # The rolling mean needs the previous window-1 closes (which also covers pct_change)
+    first_new = new_mask.argmax()
+    context_start = max(first_new - (MOVING_AVG_WINDOW - 1), 0)
+    tail = stock_df.iloc[context_start:].copy()
+
+    tail['daily_return'] = tail['close'].pct_change() * 100
+    tail['moving_avg_7d'] = tail['close'].rolling(window=MOVING_AVG_WINDOW).mean()
+    tail = tail[tail.index > last_clean].dropna()
+
+    print(f"Stock data extended with {len(tail)} new rows")
+    return pd.concat([previous_clean, tail])
+
 # Test the function
 if __name__=="__main__":
     stock_raw = get_stock_data("IBM")
@@ -32,15 +74,21 @@ if __name__=="__main__":
 
 
 # data_cleaning.py (fix the warning in clean_and_transform_marketing_data)
-def clean_and_transform_marketing_data(marketing_df):
+@instrument()
+def clean_and_transform_marketing_data(marketing_df, optimized=False):
     """
     Cleans the marketing DataFrame and adds calculated marketing metrics.
     Let's pretend our mock data is for an online store.
+    With optimized=True metrics are float32, campaign_id is categorical and
+    the intermediate cost_factor column is not kept.
     """
     if marketing_df.empty:
         return marketing_df
 
-    df = marketing_df.copy()
+    if optimized:
+        df = marketing_df.astype({col: dtype for col, dtype in MARKETING_DTYPES.items() if col in marketing_df.columns})
+    else:
+        df = marketing_df.copy()
     
     # 1. Calculate 'sales' based on our pretend metrics: visitors * conversion rate * order value
     df['sales'] = (df['daily_visitors'] * df['conversion_rate'] * df['avg_order_value']).round(2)
@@ -48,8 +96,12 @@ def clean_and_transform_marketing_data(marketing_df):
     # 2. Calculate 'cost' arbitrarily for ROAS calculation.
     np.random.seed(42)
     cost_factors = {'setosa': 0.5, 'versicolor': 0.6, 'virginica': 0.7}
-    df['cost_factor'] = df['campaign_id'].map(cost_factors)
-    df['cost'] = (df['sales'] * df['cost_factor']).round(2)
+    if optimized:
+        cost_factor = df['campaign_id'].map(cost_factors).astype('float32')
+        df['cost'] = (df['sales'] * cost_factor).round(2)
+    else:
+        df['cost_factor'] = df['campaign_id'].map(cost_factors)
+        df['cost'] = (df['sales'] * df['cost_factor']).round(2)
     
     # 3. Calculate Return on Ad Spend (ROAS)
     df['roas'] = (df['sales'] / df['cost']).round(2)
@@ -69,24 +121,55 @@ if __name__ == "__main__":
     print(marketing_clean[['sales', 'cost', 'roas']].head())
 
 
-def merge_datasets(stock_df, marketing_df):
+@instrument()
+def merge_datasets(stock_df, marketing_df, optimized=False, aligned=False):
     """
     Merges the stock and marketing DataFrames on the date index.
     Uses an inner join to only keep dates present in both datasets.
+    With optimized=True an index-aligned join is used instead of a general merge; this only
+    applies to unaligned marketing rows (the pipeline itself always merges with aligned=True).
+    With aligned=True the marketing rows are taken to be on the stock trading calendar already
+    (align_marketing_dates): each row's stock day is found with one searchsorted over the sorted
+    dates and the stock columns are gathered by position, with no join.
     """
+    if aligned:
+        merged_df = _merge_aligned(stock_df, marketing_df)
     # Inner join ensures we only have dates where both marketing and stock data exist
-    merged_df = pd.merge(marketing_df, stock_df, how='inner', left_index=True, right_index=True)
+    elif optimized:
+        merged_df = marketing_df.join(stock_df, how='inner')
+    else:
+        merged_df = pd.merge(marketing_df, stock_df, how='inner', left_index=True, right_index=True)
     
     print(f"Datasets merged successfully. Final shape: {merged_df.shape}")
     return merged_df
 
-def get_clean_data():
+def _merge_aligned(stock_df, marketing_df):
+    stock_dates = stock_df.index.to_numpy()
+    marketing_dates = marketing_df.index.to_numpy()
+    positions = np.searchsorted(stock_dates, marketing_dates)
+    found = positions < len(stock_dates)
+    found[found] = stock_dates[positions[found]] == marketing_dates[found]
+    # Days without stock data (e.g. the warm-up of the moving average) are dropped as with the join
+    rows = marketing_df if found.all() else marketing_df[found]
+    positions = positions[found]
+    return rows.assign(**{col: stock_df[col].to_numpy()[positions] for col in stock_df.columns})
+
+@instrument()
+def get_clean_data(symbol="IBM", incremental=False, optimized=False):
     """
     Main function to run the entire data acquisition and cleaning pipeline.
     Returns the merged, cleaned DataFrame.
+    With incremental=True the stored stock history is extended instead of rebuilt.
+    With optimized=True compact dtypes and copy-on-write are used to cut peak memory.
     """
+    if optimized:
+        with pd.option_context('mode.copy_on_write', True):
+            return _run_pipeline(symbol, incremental, optimized=True)
+    return _run_pipeline(symbol, incremental)
+
+def _run_pipeline(symbol, incremental, optimized=False):
     print("Acquiring data...")
-    stock_raw = get_stock_data("IBM")
+    stock_raw = get_stock_data(symbol, incremental=incremental)
     # Get the index from the raw stock data to align dates
     stock_dates = stock_raw.index 
     
@@ -94,14 +177,49 @@ def get_clean_data():
     marketing_raw = get_marketing_data(stock_dates=stock_dates)
     
     print("Cleaning and transforming data...")
-    stock_clean = clean_and_transform_Stock_data(stock_raw)
-    marketing_clean = clean_and_transform_marketing_data(marketing_raw)
+    if incremental:
+        previous_clean = load_frame(CLEAN_STOCK_HISTORY, symbol, allow_stale=True)
+        stock_clean = clean_and_transform_Stock_data(stock_raw, previous_clean=previous_clean)
+        if not stock_clean.empty:
+            save_frame(CLEAN_STOCK_HISTORY, symbol, stock_clean)
+    else:
+        stock_clean = clean_and_transform_Stock_data(stock_raw, optimized=optimized)
+    # Drop references to the raw frames as soon as they are no longer needed
+    del stock_raw
+    marketing_clean = clean_and_transform_marketing_data(marketing_raw, optimized=optimized)
+    del marketing_raw
     
     print("Merging datasets...")
-    master_df = merge_datasets(stock_clean, marketing_clean)
+    # The marketing rows are already on the trading calendar, so nothing is lost in the merge
+    master_df = merge_datasets(stock_clean, marketing_clean, optimized=optimized, aligned=True)
     
     return master_df
 
+@instrument()
+def get_clean_data_many(symbols):
+    """
+    Runs the pipeline for several symbols, fetching stock series concurrently and
+    the marketing source only once. Returns {symbol: merged DataFrame}.
+    """
+    print("Acquiring data...")
+    stock_all = get_stock_data_many(symbols)
+    try:
+        marketing_source = fetch_marketing_source()
+    except Exception as e:
+        print(f"Error fetching marketing data: {e}")
+        return {}
+
+    print("Cleaning and transforming data...")
+    results = {}
+    fetched = stock_all.index.get_level_values('symbol').unique() if not stock_all.empty else []
+    for symbol in fetched:
+        stock_raw = stock_all.xs(symbol, level='symbol')
+        marketing_raw = get_marketing_data(stock_dates=stock_raw.index, source=marketing_source)
+        stock_clean = clean_and_transform_Stock_data(stock_raw)
+        marketing_clean = clean_and_transform_marketing_data(marketing_raw)
+        results[symbol] = merge_datasets(stock_clean, marketing_clean, aligned=True)
+    return results
+
 # Test the entire pipeline
 if __name__ == "__main__":
     final_df = get_clean_data()
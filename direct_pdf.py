@@ -0,0 +1,73 @@
+# direct_pdf.py
+import textwrap
+from datetime import datetime
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_pdf import PdfPages
+from kpis import compute_kpis
+from report_utils import CHARTS, generate_insights
+
+# A4 portrait, in inches
+PAGE_SIZE = (8.27, 11.69)
+TITLE_COLOR = '#2c3e50'
+ACCENT_COLOR = '#3498db'
+MUTED_COLOR = '#7f8c8d'
+
+
+def _wrap(text, width=90):
+    return '\n'.join(textwrap.wrap(text, width))
+
+
+def _summary_page(kpis, trend_insight, roas_insight, report_date):
+    fig = Figure(figsize=PAGE_SIZE)
+    fig.text(0.5, 0.94, 'Weekly Business Performance Report', ha='center', fontsize=20,
+             color=TITLE_COLOR, weight='bold')
+    fig.text(0.5, 0.915, f'Generated on {report_date}', ha='center', fontsize=10,
+             color=MUTED_COLOR, style='italic')
+
+    fig.text(0.08, 0.86, 'Executive Summary', fontsize=14, color=ACCENT_COLOR, weight='bold')
+    fig.text(0.08, 0.82, _wrap(
+        f"This report covers business performance from {kpis.start_date:%Y-%m-%d} to "
+        f"{kpis.end_date:%Y-%m-%d}. Key metrics include stock performance, marketing ROI, "
+        f"and sales analytics."), fontsize=10, va='top')
+
+    cards = [
+        (f"${kpis.avg_sales:.2f}", 'Avg. Daily Sales'),
+        (f"{kpis.avg_roas:.2f}x", 'Avg. ROAS'),
+        (f"${kpis.final_stock_price:.2f}", 'Final Stock Price'),
+        (f"{kpis.observations}", 'Days Analyzed'),
+    ]
+    for i, (value, label) in enumerate(cards):
+        x = 0.17 + i * 0.22
+        fig.text(x, 0.72, value, ha='center', fontsize=16, color=TITLE_COLOR, weight='bold')
+        fig.text(x, 0.695, label, ha='center', fontsize=9, color=MUTED_COLOR)
+
+    fig.text(0.08, 0.62, 'Insights', fontsize=14, color=ACCENT_COLOR, weight='bold')
+    fig.text(0.08, 0.58, _wrap(f"Performance trends: {trend_insight}"), fontsize=10, va='top')
+    fig.text(0.08, 0.48, _wrap(f"Marketing campaigns: {roas_insight}"), fontsize=10, va='top')
+
+    fig.text(0.5, 0.04, 'Report generated automatically by Business Analytics Pipeline',
+             ha='center', fontsize=9, color=MUTED_COLOR)
+    return fig
+
+
+def write_direct_pdf(df, output_path, kpis=None):
+    """
+    Writes the report straight to PDF with matplotlib (summary page, then one page per chart),
+    skipping HTML rendering and parsing entirely. Returns True on success.
+    """
+    try:
+        kpis = kpis or compute_kpis(df)
+        trend_insight, roas_insight = generate_insights(df, kpis)
+        report_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+        with PdfPages(output_path) as pdf:
+            pdf.savefig(_summary_page(kpis, trend_insight, roas_insight, report_date))
+            for kind in ('trend', 'roas'):
+                draw, _ = CHARTS[kind]
+                pdf.savefig(draw(df), bbox_inches='tight')
+            info = pdf.infodict()
+            info['Title'] = 'Weekly Business Performance Report'
+        return True
+    except Exception as e:
+        print(f"Error writing PDF: {e}")
+        return False
@@ -0,0 +1,101 @@
+# downsampling.py
+import numpy as np
+import pandas as pd
+
+# Roughly one point per horizontal pixel of the plot area
+DEFAULT_PLOT_WIDTH_PX = 1000
+
+
+def _as_float(values):
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype, np.datetime64):
+        return values.astype('datetime64[ns]').astype(np.int64).astype(float)
+    return values.astype(float)
+
+
+def lttb_indices(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets: picks n_out points that preserve the visual shape of (x, y).
+    Returns the positions of the selected points. The first and last points are always kept.
+    """
+    x = _as_float(x)
+    y = _as_float(y)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    # n_out - 2 buckets over the interior points
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    n_buckets = n_out - 2
+
+    # Average of the following bucket for every bucket, from cumulative sums
+    cum_x = np.concatenate(([0.0], np.cumsum(x)))
+    cum_y = np.concatenate(([0.0], np.cumsum(y)))
+    next_lo = edges[1:]
+    next_hi = np.append(edges[2:], n)
+    counts = np.maximum(next_hi - next_lo, 1)
+    avg_x = (cum_x[next_hi] - cum_x[next_lo]) / counts
+    avg_y = (cum_y[next_hi] - cum_y[next_lo]) / counts
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    # Each bucket depends on the point picked in the previous one, so only the
+    # per-bucket triangle areas can be vectorized
+    for i in range(n_buckets):
+        lo, hi = edges[i], max(edges[i + 1], edges[i] + 1)
+        area = np.abs((x[a] - avg_x[i]) * (y[lo:hi] - y[a])
+                      - (x[a] - x[lo:hi]) * (avg_y[i] - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return np.unique(selected)
+
+
+def minmax_indices(y, n_out):
+    """
+    Min/max envelope: splits y into n_out // 2 equal buckets and keeps the minimum and
+    maximum of each, so spikes survive. Returns sorted positions; first and last are kept.
+    """
+    y = _as_float(y)
+    n = len(y)
+    n_buckets = max(n_out // 2, 1)
+    if n_out >= n:
+        return np.arange(n)
+
+    size = int(np.ceil(n / n_buckets))
+    padded = np.full(size * n_buckets, np.nan)
+    padded[:n] = y
+    buckets = padded.reshape(n_buckets, size)
+    # Drop buckets that are entirely padding or missing values
+    has_values = ~np.all(np.isnan(buckets), axis=1)
+    rows = np.flatnonzero(has_values)
+    starts = rows * size
+    mins = starts + np.nanargmin(buckets[has_values], axis=1)
+    maxs = starts + np.nanargmax(buckets[has_values], axis=1)
+    return np.unique(np.concatenate(([0, n - 1], mins, maxs)))
+
+
+def downsample_series(series, n_out=DEFAULT_PLOT_WIDTH_PX, method='lttb'):
+    """Reduces a Series (indexed by x) to about n_out points. Missing values are dropped first."""
+    series = series.dropna()
+    if len(series) <= n_out:
+        return series
+    if method == 'lttb':
+        positions = lttb_indices(series.index.to_numpy(), series.to_numpy(), n_out)
+    elif method == 'minmax':
+        positions = minmax_indices(series.to_numpy(), n_out)
+    else:
+        raise ValueError(f"Unknown downsampling method: {method}")
+    return series.iloc[positions]
+
+
+# Test the downsampling
+if __name__ == "__main__":
+    import time
+    dates = pd.date_range('2000-01-01', periods=1_000_000, freq='min')
+    walk = pd.Series(np.random.default_rng(0).normal(size=len(dates)).cumsum(), index=dates)
+    for method in ('lttb', 'minmax'):
+        started = time.perf_counter()
+        reduced = downsample_series(walk, 1000, method=method)
+        print(f"{method}: {len(walk)} -> {len(reduced)} points in {time.perf_counter() - started:.3f}s")
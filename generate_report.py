@@ -2,23 +2,264 @@
 import pandas as pd
 from datetime import datetime
 import os
+import time
+import argparse
+import logging
+import shutil
+import tempfile
+import threading
+from functools import lru_cache
+from pathlib import Path
+from urllib.parse import urlparse
+from urllib.request import url2pathname
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
 import jinja2
 from xhtml2pdf import pisa
-from data_cleaning import get_clean_data
-from report_utils import create_trend_chart_base64, create_roas_chart_base64, generate_insights
+from xhtml2pdf.default import DEFAULT_CSS
+from data_cleaning import get_clean_data, get_clean_data_many
+from report_utils import (create_trend_chart_base64, create_roas_chart_base64, chart_file, generate_insights,
+                          CHART_CACHE_DIR)
+from direct_pdf import write_direct_pdf
+from data_cache import CACHE_DIR
+from timeseries_store import get_store
+from kpis import compute_kpis
+from instrumentation import instrument, export_json, summarize, get_records, clear_records, add_records
 
-def convert_html_to_pdf(source_html, output_filename):
-    """Convert HTML to PDF using xhtml2pdf"""
+# Recent xhtml2pdf versions confine local reads to the working directory; the chart cache
+# (DATA_CACHE_DIR may be anywhere) has to be allowed explicitly
+try:
+    from xhtml2pdf.config.resources import ResourceAccessPolicy
+except ImportError:
+    ResourceAccessPolicy = None
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # Not available on Windows: processes may compile the templates at the same time
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+COMPILED_TEMPLATE_DIR = os.path.join(CACHE_DIR, 'templates_compiled')
+OUTPUT_DIR = 'output'
+
+# 'html': charts inlined as base64 data URIs (the original output)
+# 'fast': precompiled template, chart image files and the stylesheet handed to xhtml2pdf separately
+# 'direct': matplotlib writes the PDF itself, no HTML at all
+PDF_MODES = ('html', 'fast', 'direct')
+# Everything the KPIs, insights and charts read; batch reports query only these from the store
+REPORT_COLUMNS = ['sales', 'roas', 'close', 'daily_return', 'campaign_id']
+
+def _link_callback(uri, rel):
+    """Lets xhtml2pdf read chart images straight from disk"""
+    if uri.startswith('file://'):
+        return url2pathname(urlparse(uri).path)
+    return uri
+
+@lru_cache(maxsize=None)
+def _resource_policy():
+    """Resource policy that also allows reading the chart cache, or None on versions without policies"""
+    if ResourceAccessPolicy is None:
+        return None
+    return ResourceAccessPolicy(extra_roots=(Path(CHART_CACHE_DIR).resolve(),))
+
+class _ResourceErrors(logging.Handler):
+    """
+    Collects the resources xhtml2pdf could not read; it logs them and renders without them.
+    Only records from the thread that created the handler are kept, so conversions running
+    on other threads don't see each other's errors.
+    """
+
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.thread = threading.get_ident()
+        self.messages = []
+
+    def emit(self, record):
+        if record.thread != self.thread:
+            return
+        message = record.getMessage()
+        if 'resource policy' in message or 'Could not get image data' in message:
+            self.messages.append(message)
+
+@lru_cache(maxsize=None)
+def get_report_css():
+    """The report stylesheet, read once per process"""
+    with open(os.path.join(TEMPLATE_DIR, 'report.css'), encoding='utf-8') as f:
+        return f.read()
+
+@instrument()
+def convert_html_to_pdf(source_html, output_filename, external_css=False):
+    """
+    Convert HTML to PDF using xhtml2pdf.
+    With external_css the report stylesheet is passed as default CSS instead of being
+    inlined in the document, and file:// image sources are read from disk.
+    A resource that can't be read (e.g. a missing chart image) counts as a failure.
+    """
+    errors = _ResourceErrors()
+    logger = logging.getLogger('xhtml2pdf')
+    logger.addHandler(errors)
     try:
+        options = {}
+        if external_css:
+            options = {'default_css': DEFAULT_CSS + get_report_css(), 'link_callback': _link_callback}
+            if _resource_policy() is not None:
+                options['resource_policy'] = _resource_policy()
         with open(output_filename, "w+b") as output_file:
-            pisa_status = pisa.CreatePDF(source_html, dest=output_file)
-        return not pisa_status.err
+            pisa_status = pisa.CreatePDF(source_html, dest=output_file, **options)
+        for message in errors.messages:
+            print(f"Error converting HTML to PDF: {message}")
+        return not pisa_status.err and not errors.messages
     except Exception as e:
         print(f"Error converting HTML to PDF: {str(e)}")
         return False
+    finally:
+        logger.removeHandler(errors)
+
+def _is_template(name):
+    return name.endswith('.html')
+
+def _templates_compiled(stamp, newest):
+    return os.path.exists(stamp) and os.path.getmtime(stamp) >= newest
+
+def _compile_templates():
+    """
+    Compiles the HTML templates to Python modules under COMPILED_TEMPLATE_DIR, so later runs
+    skip lexing and parsing. Recompiles when a template is newer than the compiled copy.
+    Modules are compiled into a temporary directory that is then swapped in, and one process
+    compiles at a time, so no process ever imports a half-written module.
+    """
+    stamp = os.path.join(COMPILED_TEMPLATE_DIR, '.compiled')
+    newest = max(os.path.getmtime(os.path.join(TEMPLATE_DIR, name))
+                 for name in os.listdir(TEMPLATE_DIR) if _is_template(name))
+    if _templates_compiled(stamp, newest):
+        return
+
+    parent = os.path.dirname(COMPILED_TEMPLATE_DIR) or '.'
+    os.makedirs(parent, exist_ok=True)
+    with open(COMPILED_TEMPLATE_DIR + '.lock', 'w') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)  # Released when the file is closed
+        if _templates_compiled(stamp, newest):
+            return  # Another process compiled them while we waited
+        tmp_dir = tempfile.mkdtemp(dir=parent, prefix='.templates_compiled.')
+        env = jinja2.Environment(loader=jinja2.FileSystemLoader(searchpath=TEMPLATE_DIR))
+        env.compile_templates(tmp_dir, zip=None, filter_func=_is_template, ignore_errors=False)
+        with open(os.path.join(tmp_dir, '.compiled'), 'w', encoding='utf-8') as f:
+            f.write(str(newest))
+        # A non-empty directory can't be replaced in one rename: move the old copy aside first
+        old_dir = None
+        if os.path.exists(COMPILED_TEMPLATE_DIR):
+            old_dir = tempfile.mkdtemp(dir=parent, prefix='.templates_old.')
+            os.replace(COMPILED_TEMPLATE_DIR, os.path.join(old_dir, 'compiled'))
+        os.replace(tmp_dir, COMPILED_TEMPLATE_DIR)
+        if old_dir is not None:
+            shutil.rmtree(old_dir, ignore_errors=True)
+
+@lru_cache(maxsize=None)
+def get_report_template(name='report_template.html', precompiled=True):
+    """Loads the report template once per process, from the precompiled modules when possible"""
+    template_loader = jinja2.FileSystemLoader(searchpath=TEMPLATE_DIR)
+    if precompiled:
+        try:
+            _compile_templates()
+            template_loader = jinja2.ChoiceLoader([jinja2.ModuleLoader(COMPILED_TEMPLATE_DIR), template_loader])
+        except (OSError, jinja2.TemplateError) as e:
+            print(f"Template precompilation failed, using the source templates: {e}")
+    template_env = jinja2.Environment(loader=template_loader)
+    return template_env.get_template(name)
+
+@instrument()
+def render_report_html(df, trend_chart_src, roas_chart_src, inline_css=True, kpis=None):
+    """
+    Renders the report HTML for a cleaned DataFrame and its two charts.
+    Chart sources are base64 strings (inlined as data URIs) or image URIs such as file:// paths.
+    """
+    # Calculate KPIs for the report (one pass, shared with the insights)
+    kpis = kpis or compute_kpis(df)
+    trend_insight, roas_insight = generate_insights(df, kpis)
+    report_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    def image_src(src):
+        return src if ':' in src else f"data:image/png;base64,{src}"
 
-def generate_pdf_report():
-    """Main function to generate the PDF report."""
+    # Render HTML with all variables
+    return get_report_template().render(
+        report_date=report_date,
+        start_date=kpis.start_date.strftime("%Y-%m-%d"),
+        end_date=kpis.end_date.strftime("%Y-%m-%d"),
+        avg_sales=kpis.avg_sales,
+        avg_roas=kpis.avg_roas,
+        final_stock_price=kpis.final_stock_price,
+        total_observations=kpis.observations,
+        trend_chart_src=image_src(trend_chart_src),
+        roas_chart_src=image_src(roas_chart_src),
+        inline_css=inline_css,
+        trend_insight=trend_insight,
+        roas_insight=roas_insight
+    )
+
+@instrument()
+def build_report_pdf(df, pdf_path, mode='html', html_path=None, timings=None):
+    """
+    Writes the report for df to pdf_path using one of PDF_MODES.
+    html_path also writes the HTML. In 'html' mode it is self-contained; in the other modes it
+    links the cached chart images with file:// URIs, so it only opens on this machine.
+    timings, if given, is filled with the seconds spent on the 'charts', 'html' and 'pdf' steps
+    ('direct' mode draws the charts into the PDF, so it only has 'pdf').
+    Returns True on success.
+    """
+    if mode not in PDF_MODES:
+        raise ValueError(f"Unknown PDF mode {mode!r}, expected one of {PDF_MODES}")
+    timings = timings if timings is not None else {}
+    started = time.perf_counter()
+
+    def lap(stage):
+        nonlocal started
+        now = time.perf_counter()
+        timings[stage] = timings.get(stage, 0.0) + now - started
+        started = now
+
+    kpis = compute_kpis(df)
+
+    if mode == 'direct':
+        success = write_direct_pdf(df, pdf_path, kpis)
+        lap('pdf')
+        html_content = None
+    elif mode == 'fast':
+        trend_src = Path(chart_file('trend', df)).as_uri()
+        roas_src = Path(chart_file('roas', df)).as_uri()
+        lap('charts')
+        html = render_report_html(df, trend_src, roas_src, inline_css=False, kpis=kpis)
+        lap('html')
+        success = convert_html_to_pdf(html, pdf_path, external_css=True)
+        lap('pdf')
+        html_content = None
+    else:
+        trend_chart_base64 = create_trend_chart_base64(df)
+        roas_chart_base64 = create_roas_chart_base64(df)
+        lap('charts')
+        if not trend_chart_base64 or not roas_chart_base64:
+            print("Failed to create visualizations")
+            return False
+        html_content = render_report_html(df, trend_chart_base64, roas_chart_base64, kpis=kpis)
+        lap('html')
+        success = convert_html_to_pdf(html_content, pdf_path)
+        lap('pdf')
+
+    if html_path:
+        if html_content is None:
+            trend_src = Path(chart_file('trend', df)).as_uri()
+            roas_src = Path(chart_file('roas', df)).as_uri()
+            html_content = render_report_html(df, trend_src, roas_src, kpis=kpis)
+        with open(html_path, 'w', encoding='utf-8') as f:
+            f.write(html_content)
+    return success
+
+def generate_pdf_report(open_browser=True, mode='html'):
+    """
+    Main function to generate the PDF report.
+    The 'fast' and 'direct' modes only write output/report.html when it is opened in the browser.
+    """
     try:
         print("Starting report generation...")
         
@@ -30,74 +271,23 @@ def generate_pdf_report():
         
         print(f"Data loaded successfully. Shape: {df.shape}")
         
-        # Create visualizations as base64
-        print("Creating visualizations...")
-        trend_chart_base64 = create_trend_chart_base64(df)
-        roas_chart_base64 = create_roas_chart_base64(df)
-        
-        if not trend_chart_base64 or not roas_chart_base64:
-            print("Failed to create visualizations")
-            return False
-        
-        print("Visualizations created successfully")
-        
-        # Generate insights
-        trend_insight, roas_insight = generate_insights(df)
-        
-        # Calculate KPIs for the report
-        report_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        start_date = df.index.min().strftime("%Y-%m-%d")
-        end_date = df.index.max().strftime("%Y-%m-%d")
-        avg_sales = df['sales'].mean()
-        avg_roas = df['roas'].mean()
-        final_stock_price = df['close'].iloc[-1]
-        total_observations = len(df)
-        
-        print("KPIs calculated")
-        
-        # Set up Jinja2 template
-        template_loader = jinja2.FileSystemLoader(searchpath='./templates')
-        template_env = jinja2.Environment(loader=template_loader)
-        template = template_env.get_template('report_template.html')
+        os.makedirs(OUTPUT_DIR, exist_ok=True)
+        html_path = os.path.join(OUTPUT_DIR, 'report.html')
+        write_html = mode == 'html' or open_browser
         
-        print("Template loaded")
+        # Generate the PDF (and the HTML, for debugging)
+        print(f"Rendering report ({mode} mode)...")
+        pdf_path = os.path.join(OUTPUT_DIR, f'business_report_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf')
         
-        # Render HTML with all variables
-        html_content = template.render(
-            report_date=report_date,
-            start_date=start_date,
-            end_date=end_date,
-            avg_sales=avg_sales,
-            avg_roas=avg_roas,
-            final_stock_price=final_stock_price,
-            total_observations=total_observations,
-            trend_chart_base64=trend_chart_base64,
-            roas_chart_base64=roas_chart_base64,
-            trend_insight=trend_insight,
-            roas_insight=roas_insight
-        )
-        
-        print("HTML content rendered")
-        
-        # Write HTML to file (for debugging)
-        os.makedirs('output', exist_ok=True)
-        html_path = os.path.join('output', 'report.html')
-        with open(html_path, 'w', encoding='utf-8') as f:
-            f.write(html_content)
-        
-        print("HTML file written")
-        
-        # Generate PDF from HTML
-        pdf_path = os.path.join('output', f'business_report_{datetime.now().strftime("%Y%m%d_%H%M%S")}.pdf')
-        
-        success = convert_html_to_pdf(html_content, pdf_path)
+        success = build_report_pdf(df, pdf_path, mode, html_path if write_html else None)
         
         if success:
             print(f"PDF report successfully generated: {pdf_path}")
             
             # Also test opening the HTML in browser
-            import webbrowser
-            webbrowser.open(html_path)
+            if open_browser:
+                import webbrowser
+                webbrowser.open(html_path)
             
             return True
         else:
@@ -110,10 +300,139 @@ def generate_pdf_report():
         print(traceback.format_exc())
         return False
 
+def report_filename(symbol, start_date, end_date):
+    """Deterministic PDF file name for a symbol and date window"""
+    return f"business_report_{symbol}_{start_date}_{end_date}.pdf"
+
+@dataclass(frozen=True)
+class ReportResult:
+    """Outcome of one batch report: pdf_path on success, error otherwise"""
+    symbol: str
+    start_date: str
+    end_date: str
+    pdf_path: str = None
+    error: str = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+def _render_report_job(job):
+    """
+    Worker task: charts, HTML and PDF for one (symbol, window).
+    Returns (path, stage timings, the stage records made in the worker for this job).
+    """
+    symbol, start_date, end_date, df, output_dir, mode = job
+    timings = {}
+    clear_records()  # Pool workers are reused: only return this job's records
+
+    pdf_path = os.path.join(output_dir, report_filename(symbol, start_date, end_date))
+    success = build_report_pdf(df, pdf_path, mode, timings=timings)
+    return (pdf_path if success else None), timings, get_records()
+
+def generate_batch_reports(symbols, windows=None, workers=None, output_dir=OUTPUT_DIR, mode='html',
+                           from_store=False):
+    """
+    Generates one PDF per symbol x date window. Data is fetched once in this process and
+    written to the time-series store; each window is then read back with only REPORT_COLUMNS.
+    With from_store=True nothing is fetched and the stored data is used as is.
+    Charts and PDFs are rendered in a pool of worker processes; a failing report is logged
+    and doesn't stop the others.
+    windows is a list of (start_date, end_date) strings; None means the full history.
+    Returns a ReportResult per report, in the order they were queued.
+    """
+    windows = windows or [(None, None)]
+    stage_totals = {}
+    batch_started = time.perf_counter()
+    store = get_store()
+
+    started = time.perf_counter()
+    if from_store:
+        fetched = [symbol for symbol in symbols if store.date_range(symbol)[0] is not None]
+    else:
+        data = get_clean_data_many(symbols)
+        for symbol, df in data.items():
+            store.write(symbol, df)
+        fetched = list(data)
+        del data
+    stage_totals['data'] = time.perf_counter() - started
+
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = []
+    for symbol in fetched:
+        for start_date, end_date in windows:
+            window_df = store.query(symbol, REPORT_COLUMNS, start_date, end_date)
+            if window_df.empty:
+                print(f"No data for {symbol} between {start_date} and {end_date}, skipping")
+                continue
+            start_label = window_df.index.min().strftime("%Y%m%d")
+            end_label = window_df.index.max().strftime("%Y%m%d")
+            jobs.append((symbol, start_label, end_label, window_df, output_dir, mode))
+
+    print(f"Rendering {len(jobs)} reports with {workers or os.cpu_count()} workers...")
+    results = [None] * len(jobs)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(_render_report_job, job): i for i, job in enumerate(jobs)}
+        for future in as_completed(futures):
+            i = futures[future]
+            symbol, start_label, end_label = jobs[i][:3]
+            try:
+                pdf_path, timings, records = future.result()
+                add_records(records)  # So --profile-json includes the chart, html and pdf stages
+                error = None if pdf_path else "PDF rendering failed"
+            except Exception as e:
+                pdf_path, timings, error = None, {}, f"{type(e).__name__}: {e}"
+            if error:
+                print(f"Report for {symbol} {start_label}-{end_label} failed: {error}")
+            for stage, seconds in timings.items():
+                stage_totals[stage] = stage_totals.get(stage, 0.0) + seconds
+            results[i] = ReportResult(symbol, start_label, end_label, pdf_path, error)
+
+    total = time.perf_counter() - batch_started
+    written = sum(result.ok for result in results)
+    print(f"\nGenerated {written} of {len(jobs)} reports in {total:.2f}s")
+    print("Stage timings (worker stages are summed across processes):")
+    for stage, seconds in stage_totals.items():
+        print(f"  {stage:<6} {seconds:8.2f}s")
+    return results
+
+def _positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+def _parse_window(value):
+    start_date, _, end_date = value.partition(':')
+    return (start_date or None, end_date or None)
+
 if __name__ == "__main__":
-    success = generate_pdf_report()
-    
+    parser = argparse.ArgumentParser(description="Generate business performance PDF reports")
+    parser.add_argument('--symbols', nargs='+', help="Generate a batch of reports for these symbols")
+    parser.add_argument('--windows', nargs='+', type=_parse_window, default=None,
+                        help="Date windows as START:END (YYYY-MM-DD); either side may be empty")
+    parser.add_argument('--workers', type=_positive_int, default=None, help="Worker processes for batch rendering")
+    parser.add_argument('--from-store', action='store_true',
+                        help="Batch reports from the local time-series store, without fetching")
+    parser.add_argument('--no-browser', action='store_true', help="Don't open the HTML report when done")
+    parser.add_argument('--pdf-mode', choices=PDF_MODES, default='html',
+                        help="html: inline base64 charts (original); fast: precompiled template and chart files; "
+                             "direct: matplotlib PDF without HTML")
+    parser.add_argument('--profile-json', help="Write per-stage timings and sizes to this JSON file")
+    args = parser.parse_args()
+
+    if args.symbols:
+        results = generate_batch_reports(args.symbols, args.windows, args.workers, mode=args.pdf_mode,
+                                         from_store=args.from_store)
+        success = bool(results) and all(result.ok for result in results)
+    else:
+        success = generate_pdf_report(open_browser=not args.no_browser, mode=args.pdf_mode)
+
+    if args.profile_json:
+        print(summarize())
+        print(f"Stage records written to {export_json(args.profile_json)}")
+
     if success:
         print("Report generation completed successfully!")
     else:
-        print("Report generation failed. Check the error messages above.")
\ No newline at end of file
+        print("Report generation failed. Check the error messages above.")
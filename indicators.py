@@ -0,0 +1,302 @@
+# indicators.py
+import math
+from collections import deque
+import numpy as np
+import pandas as pd
+
+# Default indicator set: windows are in trading days, spans as in DataFrame.ewm(span=...)
+MA_WINDOWS = (7, 20, 50, 200)
+VOLATILITY_WINDOWS = (20,)
+CORR_WINDOWS = (20,)
+EWMA_SPANS = (12, 26)
+
+# Columns are named like the existing moving_avg_7d:
+#   moving_avg_{w}d       mean close
+#   volatility_{w}d       sample std of daily_return (in %)
+#   sales_close_corr_{w}d Pearson correlation of sales and close
+#   ewma_{s}d             exponentially weighted close (adjust=False)
+#   drawdown              close / running max close - 1
+
+
+def _rolling_sums(values, window):
+    """
+    Sum over each trailing window via one cumulative sum. NaN values are masked out of the sum
+    and counted per window, so only windows that contain one are NaN (as with rolling().sum());
+    the first window-1 entries are NaN too.
+    """
+    out = np.full(len(values), np.nan)
+    if len(values) >= window:
+        missing = np.isnan(values)
+        cs = np.concatenate(([0.0], np.cumsum(np.where(missing, 0.0, values))))
+        sums = cs[window:] - cs[:-window]
+        missing_counts = np.concatenate(([0], np.cumsum(missing)))
+        sums[missing_counts[window:] - missing_counts[:-window] > 0] = np.nan
+        out[window - 1:] = sums
+    return out
+
+
+def _center(values):
+    # nanmean so a missing value doesn't turn every centred value into NaN
+    return np.nanmean(values) if len(values) and not np.isnan(values).all() else 0.0
+
+
+def _rolling_mean_var(values, window):
+    # Centre first so the sums of squares don't lose precision on long histories
+    center = _center(values)
+    x = values - center
+    s1, s2 = _rolling_sums(x, window), _rolling_sums(x * x, window)
+    mean = s1 / window + center
+    var = np.maximum((s2 - s1 * s1 / window) / (window - 1), 0.0) if window > 1 else np.full(len(values), np.nan)
+    return mean, var
+
+
+def _rolling_corr(x, y, window):
+    # Pairs with either value missing are missing in both, as in rolling().corr()
+    missing = np.isnan(x) | np.isnan(y)
+    x, y = np.where(missing, np.nan, x), np.where(missing, np.nan, y)
+    x, y = x - _center(x), y - _center(y)
+    sx, sy = _rolling_sums(x, window), _rolling_sums(y, window)
+    sxx, syy, sxy = _rolling_sums(x * x, window), _rolling_sums(y * y, window), _rolling_sums(x * y, window)
+    cov = sxy - sx * sy / window
+    var_x, var_y = sxx - sx * sx / window, syy - sy * sy / window
+    with np.errstate(invalid='ignore', divide='ignore'):
+        corr = cov / np.sqrt(var_x * var_y)
+    return np.clip(corr, -1.0, 1.0)
+
+
+def _ewma(values, span):
+    """Recursive EWMA with alpha = 2 / (span + 1), equivalent to Series.ewm(span, adjust=False).mean()"""
+    return pd.Series(values).ewm(span=span, adjust=False).mean().to_numpy()
+
+
+def compute_indicators(df, ma_windows=MA_WINDOWS, volatility_windows=VOLATILITY_WINDOWS,
+                       corr_windows=CORR_WINDOWS, ewma_spans=EWMA_SPANS, price_col='close', sales_col='sales'):
+    """
+    Computes every requested window for one symbol in a single pass over its columns.
+    Rolling means, volatilities and correlations come from cumulative sums, so each extra
+    window costs O(n) regardless of its length. The sales/close correlation is skipped
+    when df has no sales column. A missing value makes only the windows containing it NaN,
+    as with pandas rolling().
+    Returns a DataFrame on df's index.
+    """
+    close = df[price_col].to_numpy(dtype=float)
+    out = {}
+
+    for window in ma_windows:
+        out[f'moving_avg_{window}d'] = _rolling_mean_var(close, window)[0]
+
+    if volatility_windows:
+        returns = np.zeros(len(close))
+        if len(close) > 1:
+            returns[1:] = (close[1:] / close[:-1] - 1) * 100
+        for window in volatility_windows:
+            # Windows that would include the undefined first return stay NaN, as with rolling().std()
+            std = np.sqrt(_rolling_mean_var(returns, window)[1])
+            std[:window] = np.nan
+            out[f'volatility_{window}d'] = std
+
+    if sales_col in df.columns:
+        sales = df[sales_col].to_numpy(dtype=float)
+        for window in corr_windows:
+            out[f'sales_close_corr_{window}d'] = _rolling_corr(sales, close, window)
+
+    for span in ewma_spans:
+        out[f'ewma_{span}d'] = _ewma(close, span)
+
+    # fmax skips NaN, so a missing close doesn't hide every later peak
+    out['drawdown'] = close / np.fmax.accumulate(close) - 1 if len(close) else close
+    return pd.DataFrame(out, index=df.index)
+
+
+def compute_indicators_many(frame, **kwargs):
+    """Indicators for a (symbol, date) MultiIndexed frame, as returned by get_stock_data_many()"""
+    if frame.empty:
+        return pd.DataFrame()
+    parts = {symbol: compute_indicators(group.droplevel('symbol'), **kwargs)
+             for symbol, group in frame.groupby(level='symbol', sort=False)}
+    return pd.concat(parts, names=['symbol', frame.index.names[-1]])
+
+
+def add_indicators(df, **kwargs):
+    """df with the indicator columns appended"""
+    return df.join(compute_indicators(df, **kwargs))
+
+
+class _SlidingMoments:
+    """
+    Mean, M2 and co-moment of (x, y) over the last `window` pairs, updated Welford-style.
+    Pairs with a NaN are kept in the window but left out of the moments; while the window
+    holds one, the statistics are NaN (as with pandas rolling()).
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self.values = deque()
+        self.missing = 0
+        self.n = 0
+        self.mean_x = self.mean_y = 0.0
+        self.m2_x = self.m2_y = self.c_xy = 0.0
+
+    def _add(self, x, y):
+        self.n += 1
+        dx = x - self.mean_x
+        self.mean_x += dx / self.n
+        dy = y - self.mean_y
+        self.mean_y += dy / self.n
+        self.m2_x += dx * (x - self.mean_x)
+        self.m2_y += dy * (y - self.mean_y)
+        self.c_xy += dx * (y - self.mean_y)
+
+    def _remove(self, x, y):
+        self.n -= 1
+        if self.n == 0:
+            self.mean_x = self.mean_y = 0.0
+            self.m2_x = self.m2_y = self.c_xy = 0.0
+            return
+        dx = x - self.mean_x
+        self.mean_x -= dx / self.n
+        dy = y - self.mean_y
+        self.mean_y -= dy / self.n
+        self.m2_x -= dx * (x - self.mean_x)
+        self.m2_y -= dy * (y - self.mean_y)
+        self.c_xy -= dx * (y - self.mean_y)
+
+    def push(self, x, y=0.0):
+        # Add the new pair...
+        self.values.append((x, y))
+        if math.isnan(x) or math.isnan(y):
+            self.missing += 1
+        else:
+            self._add(x, y)
+        # ...then drop the one leaving the window
+        if len(self.values) > self.window:
+            old_x, old_y = self.values.popleft()
+            if math.isnan(old_x) or math.isnan(old_y):
+                self.missing -= 1
+            else:
+                self._remove(old_x, old_y)
+
+    @property
+    def full(self):
+        return self.n == self.window and not self.missing
+
+    def mean(self):
+        return self.mean_x if self.full else math.nan
+
+    def std(self):
+        return math.sqrt(max(self.m2_x, 0.0) / (self.n - 1)) if self.full and self.n > 1 else math.nan
+
+    def corr(self):
+        denominator = math.sqrt(max(self.m2_x, 0.0) * max(self.m2_y, 0.0))
+        if not self.full or not denominator:
+            return math.nan
+        return max(-1.0, min(1.0, self.c_xy / denominator))
+
+
+class IndicatorState:
+    """
+    The indicator set for one symbol, updated one day at a time. Each window keeps only
+    its last `window` values, so append() costs O(number of windows), not O(history).
+    Matches compute_indicators() up to floating-point rounding.
+    """
+
+    def __init__(self, ma_windows=MA_WINDOWS, volatility_windows=VOLATILITY_WINDOWS,
+                 corr_windows=CORR_WINDOWS, ewma_spans=EWMA_SPANS):
+        self.ma = {w: _SlidingMoments(w) for w in ma_windows}
+        self.volatility = {w: _SlidingMoments(w) for w in volatility_windows}
+        self.corr = {w: _SlidingMoments(w) for w in corr_windows}
+        self.ewma = dict.fromkeys(ewma_spans)  # span -> (value, weight of the value) once started
+        self.peak = -math.inf
+        self.last_close = None
+        self.last_date = None
+
+    @classmethod
+    def from_history(cls, df, price_col='close', sales_col='sales', **kwargs):
+        """Builds the state from existing history (a one-off O(history) replay)"""
+        state = cls(**kwargs)
+        close = df[price_col].to_numpy(dtype=float)
+        sales = df[sales_col].to_numpy(dtype=float) if sales_col in df.columns else [None] * len(close)
+        for date, c, s in zip(df.index, close, sales):
+            state.append(date, c, s)
+        return state
+
+    def append(self, date, close, sales=None):
+        """Adds one day and returns its indicator values as a dict keyed like compute_indicators()"""
+        if self.last_date is not None and date <= self.last_date:
+            raise ValueError(f"{date} is not after the last appended date {self.last_date}")
+        row = {}
+
+        for window, moments in self.ma.items():
+            moments.push(close)
+            row[f'moving_avg_{window}d'] = moments.mean()
+
+        if self.last_close is not None:
+            daily_return = (close / self.last_close - 1) * 100
+            for moments in self.volatility.values():
+                moments.push(daily_return)
+        for window, moments in self.volatility.items():
+            row[f'volatility_{window}d'] = moments.std()
+
+        if sales is not None:
+            for window, moments in self.corr.items():
+                moments.push(sales, close)
+                row[f'sales_close_corr_{window}d'] = moments.corr()
+
+        for span, previous in self.ewma.items():
+            alpha = 2 / (span + 1)
+            if previous is None:
+                self.ewma[span] = None if math.isnan(close) else (close, 1.0)
+            else:
+                # As pandas ewm(adjust=False): the old weight keeps decaying over missing days
+                value, old_weight = previous
+                old_weight *= 1 - alpha
+                if not math.isnan(close):
+                    value = (old_weight * value + alpha * close) / (old_weight + alpha)
+                    old_weight = 1.0
+                self.ewma[span] = (value, old_weight)
+            row[f'ewma_{span}d'] = self.ewma[span][0] if self.ewma[span] is not None else math.nan
+
+        if not math.isnan(close):
+            self.peak = max(self.peak, close)
+        row['drawdown'] = close / self.peak - 1
+
+        self.last_close = close
+        self.last_date = date
+        return row
+
+    def extend(self, df, price_col='close', sales_col='sales'):
+        """Appends every row of df (newer than the state) and returns their indicators as a DataFrame"""
+        if self.last_date is not None:
+            df = df[df.index > self.last_date]
+        close = df[price_col].to_numpy(dtype=float)
+        sales = df[sales_col].to_numpy(dtype=float) if sales_col in df.columns else [None] * len(close)
+        rows = [self.append(date, c, s) for date, c, s in zip(df.index, close, sales)]
+        return pd.DataFrame(rows, index=df.index)
+
+
+# Check the vectorized and incremental paths against pandas and each other
+if __name__ == "__main__":
+    import time
+    rng = np.random.default_rng(0)
+    n = 2_000
+    dates = pd.date_range('2015-01-01', periods=n, freq='B')
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    test_df = pd.DataFrame({'close': close, 'sales': close * 0.3 + rng.normal(0, 5, n)}, index=dates)
+
+    started = time.perf_counter()
+    vectorized = compute_indicators(test_df)
+    print(f"Vectorized: {len(vectorized.columns)} indicators x {n} rows in {time.perf_counter() - started:.4f}s")
+
+    expected = pd.DataFrame({
+        'moving_avg_200d': test_df['close'].rolling(200).mean(),
+        'volatility_20d': (test_df['close'].pct_change() * 100).rolling(20).std(),
+        'sales_close_corr_20d': test_df['sales'].rolling(20).corr(test_df['close']),
+        'ewma_12d': test_df['close'].ewm(span=12, adjust=False).mean(),
+    })
+    print("Max error vs pandas:", (vectorized[expected.columns] - expected).abs().max().max())
+
+    state = IndicatorState.from_history(test_df.iloc[:-250])
+    started = time.perf_counter()
+    incremental = state.extend(test_df.iloc[-250:])
+    print(f"Incremental: 250 appends in {time.perf_counter() - started:.4f}s")
+    print("Max error vs vectorized:", (incremental - vectorized.iloc[-250:]).abs().max().max())
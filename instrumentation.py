@@ -0,0 +1,261 @@
+# instrumentation.py
+import os
+import json
+import time
+import threading
+import functools
+import tracemalloc
+from collections import deque, defaultdict
+from contextlib import contextmanager
+import pandas as pd
+
+# Set PIPELINE_TRACE_MEMORY=1 to record peak Python memory per stage (slows everything down)
+TRACE_MEMORY = os.getenv('PIPELINE_TRACE_MEMORY') == '1'
+# Set PIPELINE_PROFILER=cprofile or pyinstrument to write a profile for every stage
+PROFILER = os.getenv('PIPELINE_PROFILER', '').lower()
+PROFILE_DIR = os.getenv('PIPELINE_PROFILE_DIR', os.path.join('output', 'profiles'))
+MAX_RECORDS = 10_000
+
+# Histogram buckets (seconds) for the Prometheus metrics
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_records = deque(maxlen=MAX_RECORDS)
+_records_lock = threading.Lock()
+_memory_stack = threading.local()
+# tracemalloc's peak is process-wide: stages traced on other threads at the same time
+# make each other's peaks meaningless, so those peaks are dropped (thread id -> open records)
+_traced_stages = {}
+_traced_lock = threading.Lock()
+
+
+def _size(obj):
+    """(rows, bytes) for the objects stages pass around; None where it doesn't apply"""
+    if isinstance(obj, pd.DataFrame):
+        return len(obj), int(obj.memory_usage(index=True, deep=False).sum())
+    if isinstance(obj, pd.Series):
+        return len(obj), int(obj.memory_usage(index=True, deep=False))
+    if isinstance(obj, (bytes, bytearray)):
+        return None, len(obj)
+    if isinstance(obj, str):
+        return None, len(obj.encode('utf-8'))
+    if isinstance(obj, dict) and obj and all(isinstance(v, pd.DataFrame) for v in obj.values()):
+        sizes = [_size(v) for v in obj.values()]
+        return sum(r for r, _ in sizes), sum(b for _, b in sizes)
+    return None, None
+
+
+def _first_payload(args, kwargs):
+    for value in list(args) + list(kwargs.values()):
+        if isinstance(value, (pd.DataFrame, pd.Series, bytes, bytearray, str)):
+            return value
+    return None
+
+
+@contextmanager
+def _profiled(name):
+    if PROFILER == 'cprofile':
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            profiler.dump_stats(os.path.join(PROFILE_DIR, f"{name}-{time.time_ns()}.prof"))
+    elif PROFILER == 'pyinstrument':
+        from pyinstrument import Profiler
+        profiler = Profiler()
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            with open(os.path.join(PROFILE_DIR, f"{name}-{time.time_ns()}.html"), 'w', encoding='utf-8') as f:
+                f.write(profiler.output_html())
+    else:
+        yield
+
+
+@contextmanager
+def stage(name, payload_in=None):
+    """
+    Records wall time, rows/bytes in and out, and (optionally) peak memory for a block.
+    Yields the record; set record['rows_out'] / record['bytes_out'] inside the block if known.
+    Peak memory is only recorded for stages that didn't overlap a traced stage on another
+    thread (e.g. concurrent Dash callbacks); for those peak_bytes stays None.
+    """
+    rows_in, bytes_in = _size(payload_in)
+    record = {'stage': name, 'started_at': time.time(), 'rows_in': rows_in, 'bytes_in': bytes_in,
+              'rows_out': None, 'bytes_out': None, 'peak_bytes': None, 'error': None}
+
+    # Nested stages reset the tracemalloc peak, so each frame keeps the highest peak seen below it
+    stack = getattr(_memory_stack, 'peaks', None)
+    if stack is None:
+        stack = _memory_stack.peaks = []
+    if TRACE_MEMORY:
+        thread_id = threading.get_ident()
+        with _traced_lock:
+            overlapping = [r for tid, records in _traced_stages.items() if tid != thread_id for r in records]
+            for other in overlapping:
+                other['_shared_peak'] = True
+            record['_shared_peak'] = bool(overlapping)
+            _traced_stages.setdefault(thread_id, []).append(record)
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if stack:
+            stack[-1] = max(stack[-1], tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        stack.append(0)
+
+    started = time.perf_counter()
+    try:
+        with _profiled(name):
+            yield record
+    except BaseException as e:
+        record['error'] = type(e).__name__
+        raise
+    finally:
+        record['seconds'] = time.perf_counter() - started
+        if TRACE_MEMORY:
+            peak = max(stack.pop(), tracemalloc.get_traced_memory()[1])
+            if stack:
+                stack[-1] = max(stack[-1], peak)
+            with _traced_lock:
+                open_records = _traced_stages[thread_id]
+                open_records.remove(record)
+                if not open_records:
+                    del _traced_stages[thread_id]
+                shared = record.pop('_shared_peak')
+            record['peak_bytes'] = None if shared else peak
+        with _records_lock:
+            _records.append(record)
+
+
+def instrument(name=None):
+    """Decorator form of stage(): sizes come from the first frame/bytes argument and the return value"""
+    def decorator(func):
+        stage_name = name or f"{func.__module__}.{func.__name__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(stage_name, _first_payload(args, kwargs)) as record:
+                result = func(*args, **kwargs)
+                out = result[0] if isinstance(result, tuple) and result else result
+                record['rows_out'], record['bytes_out'] = _size(out)
+                return result
+        return wrapper
+    return decorator
+
+
+def get_records(stage_prefix=None):
+    with _records_lock:
+        return [dict(r) for r in _records if stage_prefix is None or r['stage'].startswith(stage_prefix)]
+
+
+def clear_records():
+    with _records_lock:
+        _records.clear()
+
+
+def add_records(records):
+    """Adds records made elsewhere, e.g. returned by a worker process with its result"""
+    with _records_lock:
+        _records.extend(records)
+
+
+def summarize(records=None):
+    """Per-stage call count, total/mean/max seconds and max peak memory"""
+    records = get_records() if records is None else records
+    if not records:
+        return pd.DataFrame()
+    df = pd.DataFrame(records)
+    return df.groupby('stage').agg(
+        calls=('seconds', 'size'), total_seconds=('seconds', 'sum'), mean_seconds=('seconds', 'mean'),
+        max_seconds=('seconds', 'max'), rows_out=('rows_out', 'max'), peak_bytes=('peak_bytes', 'max'),
+    ).sort_values('total_seconds', ascending=False)
+
+
+def export_json(path):
+    """Writes all recorded stages to a JSON file (for comparing runs across commits)"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(get_records(), f, indent=2, default=str)
+    return path
+
+
+class CallbackMetrics:
+    """Request counts, errors and a latency histogram per Dash callback, in Prometheus text format"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counts = defaultdict(int)
+        self._errors = defaultdict(int)
+        self._sums = defaultdict(float)
+        self._bucket_counts = defaultdict(lambda: [0] * len(self.buckets))
+
+    def observe(self, callback, seconds, error=False):
+        with self._lock:
+            self._counts[callback] += 1
+            self._sums[callback] += seconds
+            if error:
+                self._errors[callback] += 1
+            counts = self._bucket_counts[callback]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    counts[i] += 1
+
+    def wrap(self, callback_name):
+        """Decorator recording a callback as a pipeline stage and in the metrics.
+        PreventUpdate is a normal outcome, not an error."""
+        def decorator(func):
+            instrumented = instrument(f"callback.{callback_name}")(func)
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                error = False
+                try:
+                    return instrumented(*args, **kwargs)
+                except Exception as e:
+                    error = type(e).__name__ != 'PreventUpdate'
+                    raise
+                finally:
+                    self.observe(callback_name, time.perf_counter() - started, error)
+            return wrapper
+        return decorator
+
+    def render(self):
+        lines = [
+            '# HELP dashboard_callback_requests_total Dash callback invocations.',
+            '# TYPE dashboard_callback_requests_total counter',
+        ]
+        with self._lock:
+            for name, count in sorted(self._counts.items()):
+                lines.append(f'dashboard_callback_requests_total{{callback="{name}"}} {count}')
+            lines += ['# HELP dashboard_callback_errors_total Dash callbacks that raised an error.',
+                      '# TYPE dashboard_callback_errors_total counter']
+            for name in sorted(self._counts):
+                lines.append(f'dashboard_callback_errors_total{{callback="{name}"}} {self._errors[name]}')
+            lines += ['# HELP dashboard_callback_duration_seconds Dash callback latency.',
+                      '# TYPE dashboard_callback_duration_seconds histogram']
+            for name in sorted(self._counts):
+                for bound, count in zip(self.buckets, self._bucket_counts[name]):
+                    lines.append(f'dashboard_callback_duration_seconds_bucket{{callback="{name}",le="{bound}"}} {count}')
+                lines.append(f'dashboard_callback_duration_seconds_bucket{{callback="{name}",le="+Inf"}} {self._counts[name]}')
+                lines.append(f'dashboard_callback_duration_seconds_sum{{callback="{name}"}} {self._sums[name]:.6f}')
+                lines.append(f'dashboard_callback_duration_seconds_count{{callback="{name}"}} {self._counts[name]}')
+        return '\n'.join(lines) + '\n'
+
+
+# Test the instrumentation
+if __name__ == "__main__":
+    @instrument('demo.double')
+    def double(df):
+        return pd.concat([df, df])
+
+    with stage('demo.outer'):
+        double(pd.DataFrame({'a': range(100_000)}))
+    print(summarize())
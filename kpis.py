@@ -0,0 +1,124 @@
+# kpis.py
+from dataclasses import dataclass
+import numpy as np
+import pandas as pd
+
+KPI_QUANTILES = (0.25, 0.5, 0.75)
+QUANTILE_COLS = ['sales', 'roas', 'close', 'daily_return']
+
+
+@dataclass(frozen=True)
+class KPIResult:
+    """Every aggregate the report and dashboard show, computed together by compute_kpis"""
+    start_date: pd.Timestamp
+    end_date: pd.Timestamp
+    observations: int
+    avg_sales: float
+    avg_roas: float
+    final_stock_price: float
+    sales_close_corr: float
+    campaign_roas: pd.Series      # mean ROAS per campaign
+    campaign_counts: pd.Series    # rows with a ROAS value per campaign
+    best_campaign: str
+    worst_campaign: str
+    quantiles: pd.DataFrame       # rows: quantile levels, columns: QUANTILE_COLS
+
+
+def _campaign_codes(campaign):
+    # Categorical columns already carry integer codes; otherwise factorize once
+    if isinstance(campaign.dtype, pd.CategoricalDtype):
+        return campaign.cat.codes.to_numpy(), campaign.cat.categories
+    return pd.factorize(campaign, sort=True)
+
+
+def compute_kpis(df, quantiles=KPI_QUANTILES):
+    """
+    Computes the report and dashboard aggregates in one vectorized pass over the columns:
+    means, per-campaign ROAS (np.bincount over campaign codes), the sales/close correlation,
+    quantiles and the latest close.
+    """
+    n = len(df)
+    sales = df['sales'].to_numpy(dtype=float)
+    roas = df['roas'].to_numpy(dtype=float)
+    close = df['close'].to_numpy(dtype=float)
+
+    # Per-campaign ROAS sums and counts in a single pass each
+    codes, categories = _campaign_codes(df['campaign_id'])
+    valid = (codes >= 0) & ~np.isnan(roas)
+    counts = np.bincount(codes[valid], minlength=len(categories))
+    sums = np.bincount(codes[valid], weights=roas[valid], minlength=len(categories))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        campaign_means = sums / counts
+    campaign_roas = pd.Series(campaign_means, index=categories, name='roas')
+    has_roas = ~np.isnan(campaign_means)
+    best_campaign = categories[np.nanargmax(campaign_means)] if has_roas.any() else None
+    worst_campaign = categories[np.nanargmin(campaign_means)] if has_roas.any() else None
+
+    # Pearson correlation over rows where both values are present (as Series.corr does)
+    pair = ~np.isnan(sales) & ~np.isnan(close)
+    m = pair.sum()
+    if m > 1:
+        x, y = sales[pair], close[pair]
+        dx, dy = x - x.mean(), y - y.mean()
+        denominator = np.sqrt(np.dot(dx, dx) * np.dot(dy, dy))
+        sales_close_corr = float(np.dot(dx, dy) / denominator) if denominator else np.nan
+    else:
+        sales_close_corr = np.nan
+
+    # All quantiles for all columns in one call
+    present = [col for col in QUANTILE_COLS if col in df.columns]
+    if n and present:
+        values = df[present].to_numpy(dtype=float)
+        quantile_table = pd.DataFrame(np.nanquantile(values, quantiles, axis=0),
+                                      index=list(quantiles), columns=present)
+    else:
+        quantile_table = pd.DataFrame(index=list(quantiles), columns=present, dtype=float)
+
+    return KPIResult(
+        start_date=df.index.min() if n else None,
+        end_date=df.index.max() if n else None,
+        observations=n,
+        avg_sales=float(np.nanmean(sales)) if n else np.nan,
+        avg_roas=float(np.nanmean(roas)) if valid.any() else np.nan,
+        final_stock_price=float(close[-1]) if n else np.nan,
+        sales_close_corr=sales_close_corr,
+        campaign_roas=campaign_roas,
+        campaign_counts=pd.Series(counts, index=categories, name='count'),
+        best_campaign=best_campaign,
+        worst_campaign=worst_campaign,
+        quantiles=quantile_table,
+    )
+
+
+def _legacy_kpis(df):
+    # What the report and dashboard computed before, for the benchmark below
+    best = df.groupby('campaign_id')['roas'].mean().idxmax()
+    worst = df.groupby('campaign_id')['roas'].mean().idxmin()
+    best_again = df.groupby('campaign_id')['roas'].mean().idxmax()
+    return (df['sales'].mean(), df['roas'].mean(), df['close'].iloc[-1],
+            df['sales'].corr(df['close']), best, worst, best_again)
+
+
+# Benchmark against the repeated groupby calls
+if __name__ == "__main__":
+    import time
+    for rows in (1_000_000, 10_000_000, 30_000_000):
+        rng = np.random.default_rng(0)
+        campaigns = np.array(['setosa', 'versicolor', 'virginica'])
+        bench_df = pd.DataFrame({
+            'sales': rng.gamma(2.0, 50.0, rows),
+            'roas': rng.normal(1.6, 0.2, rows),
+            'close': rng.normal(150, 10, rows),
+            'daily_return': rng.normal(0, 1, rows),
+            'campaign_id': pd.Categorical(campaigns[rng.integers(0, 3, rows)]),
+        }, index=pd.date_range('2000-01-01', periods=rows, freq='min'))
+
+        started = time.perf_counter()
+        _legacy_kpis(bench_df)
+        legacy = time.perf_counter() - started
+
+        started = time.perf_counter()
+        compute_kpis(bench_df)
+        single_pass = time.perf_counter() - started
+        print(f"{rows:>11,} rows: legacy {legacy:.3f}s, compute_kpis {single_pass:.3f}s "
+              f"(includes quantiles)")
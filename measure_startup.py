@@ -0,0 +1,36 @@
+# measure_startup.py
+import os
+import sys
+import subprocess
+import tempfile
+import time
+
+RUNS = 3
+
+
+def time_import(eager, runs=RUNS, cold=False):
+    """Imports app.py in fresh interpreters and returns the wall time of each run in seconds.
+    With cold=True every run starts from an empty cache directory (no snapshot file)."""
+    env = dict(os.environ)
+    env['DASHBOARD_EAGER_LOAD'] = '1' if eager else '0'
+    timings = []
+    for _ in range(runs):
+        if cold:
+            env['DATA_CACHE_DIR'] = tempfile.mkdtemp(prefix='startup-cold-')
+        started = time.perf_counter()
+        subprocess.run([sys.executable, '-c', 'import app'], env=env, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+if __name__ == "__main__":
+    print("Measuring dashboard startup (time until `server` is importable)...")
+    # The eager run also writes the snapshot the lazy runs start from
+    eager = time_import(eager=True)
+    lazy = time_import(eager=False)
+    cold = time_import(eager=False, cold=True)
+    print(f"Eager load (fetch + clean before serving): best {min(eager):.2f}s, mean {sum(eager) / len(eager):.2f}s")
+    print(f"Lazy load (cached snapshot, background refresh): best {min(lazy):.2f}s, mean {sum(lazy) / len(lazy):.2f}s")
+    print(f"Lazy load, cold cache (no snapshot yet): best {min(cold):.2f}s, mean {sum(cold) / len(cold):.2f}s")
+    print(f"Speedup: {min(eager) / min(lazy):.1f}x")
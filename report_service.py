@@ -0,0 +1,355 @@
+# report_service.py
+"""
+Headless report service: renders PDF reports on request, outside the dashboard process.
+
+    python report_service.py --port 8060 --workers 2
+
+    POST /reports            {"symbol": "IBM", "start_date": "2024-01-01", "end_date": null, "mode": "fast"}
+                             -> 202 with the job (200 if the PDF was already cached)
+    GET  /reports/<job_id>   job status and stage timings
+    GET  /reports/<job_id>/pdf
+    GET  /reports            recent jobs
+    GET  /metrics            queue depth, job counts, cache and deduplication hits
+"""
+import os
+import json
+import time
+import uuid
+import hashlib
+import argparse
+import threading
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from dataclasses import dataclass, field, asdict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from data_cache import CACHE_DIR, frame_version, record_file, touch_file
+from data_cleaning import get_clean_data
+from generate_report import build_report_pdf, PDF_MODES, REPORT_COLUMNS
+from timeseries_store import get_store
+
+SERVICE_HOST = os.getenv('REPORT_SERVICE_HOST', '127.0.0.1')
+SERVICE_PORT = int(os.getenv('REPORT_SERVICE_PORT', 8060))
+# Reports rendered at the same time (one process each: xhtml2pdf and matplotlib aren't thread-safe)
+REPORT_WORKERS = int(os.getenv('REPORT_WORKERS', 2))
+# Distinct jobs allowed to wait or run at once; further requests get 503 until the queue drains
+MAX_PENDING_JOBS = int(os.getenv('REPORT_MAX_PENDING_JOBS', 32))
+# Finished jobs kept for status queries
+KEEP_JOBS = 1000
+# Rendered PDFs share the data cache's size cap and LRU eviction
+REPORT_CACHE_DIR = os.getenv('REPORT_CACHE_DIR', os.path.join(CACHE_DIR, 'reports'))
+DEFAULT_MODE = 'fast'
+
+
+class QueueFullError(Exception):
+    """Raised when MAX_PENDING_JOBS distinct jobs are already queued or running"""
+
+
+@dataclass
+class ReportJob:
+    """One report request and its progress. Identical concurrent requests share a job."""
+    job_id: str
+    symbol: str
+    start_date: str
+    end_date: str
+    mode: str
+    status: str = 'queued'  # queued -> running -> done | failed
+    requests: int = 1
+    cached: bool = False
+    version: str = None
+    pdf_path: str = None
+    error: str = None
+    created_at: float = field(default_factory=time.time)
+    started_at: float = None
+    finished_at: float = None
+    timings: dict = field(default_factory=dict)
+
+    def to_dict(self):
+        info = asdict(self)
+        info.pop('pdf_path')
+        if self.started_at is not None:
+            info['queued_seconds'] = round(self.started_at - self.created_at, 4)
+        if self.finished_at is not None:
+            info['total_seconds'] = round(self.finished_at - self.created_at, 4)
+        return info
+
+
+def report_cache_path(cache_dir, symbol, version, start_date, end_date, mode):
+    """Cached PDF for one data version and set of parameters"""
+    params = f"{symbol}|{version}|{start_date}|{end_date}|{mode}"
+    digest = hashlib.sha1(params.encode('utf-8')).hexdigest()[:20]
+    return os.path.join(cache_dir, f"{symbol}_{digest}.pdf")
+
+
+def _render_pdf(df, pdf_path, mode):
+    """Worker process task: writes the PDF atomically. Returns (success, seconds)."""
+    started = time.perf_counter()
+    tmp_path = f"{pdf_path}.{os.getpid()}.tmp"
+    success = build_report_pdf(df, tmp_path, mode)
+    if success:
+        os.replace(tmp_path, pdf_path)
+    elif os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    return success, time.perf_counter() - started
+
+
+class ReportService:
+    """
+    Job queue in front of a bounded pool of rendering processes.
+    Requests are deduplicated while in flight (single-flight on the parameters), and PDFs are
+    cached on disk by symbol, data version and parameters, so a repeated request costs one
+    store query and a hash. Data comes from the time-series store; a symbol that isn't stored
+    yet (or a request with refresh) is fetched once and written to the store.
+    """
+
+    def __init__(self, store=None, workers=REPORT_WORKERS, max_pending=MAX_PENDING_JOBS,
+                 cache_dir=REPORT_CACHE_DIR):
+        self.store = store or get_store()
+        self.max_pending = max_pending
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        # Threads prepare jobs (store reads, cache checks); processes render
+        self._jobs_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='report-job')
+        self._render_executor = ProcessPoolExecutor(max_workers=workers)
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._inflight = {}
+        self._fetch_locks = defaultdict(threading.Lock)
+        self.counters = defaultdict(int)
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def submit(self, symbol, start_date=None, end_date=None, mode=DEFAULT_MODE, refresh=False):
+        """
+        Returns the job for a report: an existing one for an identical pending request, an
+        already finished one when the PDF for the stored data is cached, or a newly queued one.
+        """
+        if not isinstance(symbol, str) or not symbol.strip():
+            raise ValueError("symbol must be a non-empty string")
+        for name, value in (('start_date', start_date), ('end_date', end_date)):
+            if value is not None and not isinstance(value, str):
+                raise ValueError(f"{name} must be a date string or null")
+        if mode not in PDF_MODES:
+            raise ValueError(f"Unknown PDF mode {mode!r}, expected one of {PDF_MODES}")
+        symbol = symbol.strip().upper()
+        key = (symbol, start_date, end_date, mode)
+        with self._lock:
+            job = self._inflight.get(key)
+            if job is not None:
+                job.requests += 1
+                self.counters['deduplicated'] += 1
+                return job
+
+        job = ReportJob(uuid.uuid4().hex[:12], symbol, start_date, end_date, mode)
+        df = pdf_path = None
+        if not refresh and self.store.date_range(symbol)[0] is not None:
+            # Cached PDFs are answered right away, without a trip through the queue
+            try:
+                df, pdf_path = self._lookup(job)
+            except Exception:
+                df = pdf_path = None  # The queued job reports the error
+            if pdf_path is not None and os.path.exists(pdf_path):
+                touch_file(pdf_path)
+                job.cached = True
+                job.pdf_path = pdf_path
+                job.status = 'done'
+                job.started_at = job.finished_at = time.time()
+                with self._lock:
+                    self._remember(job)
+                    self.counters['submitted'] += 1
+                    self.counters['cache_hits'] += 1
+                return job
+
+        with self._lock:
+            pending = self._inflight.get(key)
+            if pending is not None:
+                pending.requests += 1
+                self.counters['deduplicated'] += 1
+                return pending
+            if len(self._inflight) >= self.max_pending:
+                self.counters['rejected'] += 1
+                raise QueueFullError(f"{len(self._inflight)} reports already pending")
+            self._inflight[key] = job
+            self._remember(job)
+            self.counters['submitted'] += 1
+        self._jobs_executor.submit(self._run, key, job, refresh, df, pdf_path)
+        return job
+
+    def _remember(self, job):
+        # Called with self._lock held
+        self._jobs[job.job_id] = job
+        while len(self._jobs) > KEEP_JOBS:
+            self._jobs.popitem(last=False)
+
+    def _fetch(self, symbol, refresh):
+        """Fetches a symbol into the store when it isn't stored yet (or refresh is set)"""
+        if refresh or self.store.date_range(symbol)[0] is None:
+            # One fetch per symbol at a time; waiting jobs then read what it stored
+            with self._lock:
+                fetch_lock = self._fetch_locks[symbol]
+            with fetch_lock:
+                if refresh or self.store.date_range(symbol)[0] is None:
+                    df = get_clean_data(symbol)
+                    if df.empty:
+                        raise ValueError(f"No data available for {symbol}")
+                    self.store.write(symbol, df)
+
+    def _lookup(self, job):
+        """Reads the job's window from the store and returns (df, cached PDF path for its data version)"""
+        started = time.perf_counter()
+        df = self.store.query(job.symbol, REPORT_COLUMNS, job.start_date, job.end_date)
+        if df.empty:
+            raise ValueError(f"No data for {job.symbol} between {job.start_date} and {job.end_date}")
+        job.version = frame_version(df)
+        job.timings['data'] = round(time.perf_counter() - started, 4)
+        return df, report_cache_path(self.cache_dir, job.symbol, job.version, job.start_date, job.end_date, job.mode)
+
+    def _run(self, key, job, refresh, df=None, pdf_path=None):
+        job.started_at = time.time()
+        job.status = 'running'
+        try:
+            if df is None:
+                started = time.perf_counter()
+                self._fetch(job.symbol, refresh)
+                df, pdf_path = self._lookup(job)
+                job.timings['data'] = round(time.perf_counter() - started, 4)
+
+            if os.path.exists(pdf_path):
+                touch_file(pdf_path)
+                job.cached = True
+                self._count('cache_hits')
+            else:
+                success, seconds = self._render_executor.submit(_render_pdf, df, pdf_path, job.mode).result()
+                job.timings['render'] = round(seconds, 4)
+                if not success:
+                    raise RuntimeError("PDF rendering failed")
+                record_file(pdf_path)
+                self._count('rendered')
+            job.pdf_path = pdf_path
+            job.status = 'done'
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}"
+            job.status = 'failed'
+            self._count('failed')
+            print(f"Report job {job.job_id} ({job.symbol}) failed: {job.error}")
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self, limit=100):
+        with self._lock:
+            return list(self._jobs.values())[-limit:]
+
+    def wait(self, job, timeout=None, poll_seconds=0.05):
+        """Blocks until the job has finished (or timeout); returns the job"""
+        deadline = None if timeout is None else time.time() + timeout
+        while job.status in ('queued', 'running') and (deadline is None or time.time() < deadline):
+            time.sleep(poll_seconds)
+        return job
+
+    def stats(self):
+        with self._lock:
+            by_status = defaultdict(int)
+            for job in self._jobs.values():
+                by_status[job.status] += 1
+            return {'pending': len(self._inflight), 'max_pending': self.max_pending,
+                    'jobs': dict(by_status), **self.counters}
+
+    def shutdown(self):
+        self._jobs_executor.shutdown(wait=True)
+        self._render_executor.shutdown(wait=True)
+
+
+class ReportRequestHandler(BaseHTTPRequestHandler):
+    """JSON endpoints of the service; the ReportService is server.service"""
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_pdf(self, path):
+        try:
+            with open(path, 'rb') as f:
+                body = f.read()
+        except FileNotFoundError:
+            return self._send_json(410, {'error': 'The PDF was evicted from the cache; submit the report again'})
+        touch_file(path)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/pdf')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Content-Disposition', f'inline; filename="{os.path.basename(path)}"')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/reports':
+            return self._send_json(404, {'error': 'Not found'})
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            params = json.loads(self.rfile.read(length) or b'{}')
+            if not isinstance(params, dict):
+                return self._send_json(400, {'error': 'Expected a JSON object'})
+            if not params.get('symbol'):
+                return self._send_json(400, {'error': 'symbol is required'})
+            job = self.server.service.submit(params['symbol'], params.get('start_date'), params.get('end_date'),
+                                             params.get('mode', DEFAULT_MODE), bool(params.get('refresh')))
+        except QueueFullError as e:
+            return self._send_json(503, {'error': str(e)})
+        except ValueError as e:  # Includes malformed JSON
+            return self._send_json(400, {'error': str(e)})
+        self._send_json(200 if job.status == 'done' else 202, job.to_dict())
+
+    def do_GET(self):
+        service = self.server.service
+        parts = [part for part in self.path.split('?')[0].split('/') if part]
+        if parts == ['metrics']:
+            return self._send_json(200, service.stats())
+        if parts == ['reports']:
+            return self._send_json(200, {'jobs': [job.to_dict() for job in service.jobs()]})
+        if len(parts) in (2, 3) and parts[0] == 'reports':
+            job = service.get(parts[1])
+            if job is None:
+                return self._send_json(404, {'error': f"Unknown job {parts[1]}"})
+            if len(parts) == 2:
+                return self._send_json(200, job.to_dict())
+            if parts[2] == 'pdf':
+                if job.status != 'done':
+                    return self._send_json(409, {'error': f"Job is {job.status}", 'job': job.to_dict()})
+                return self._send_pdf(job.pdf_path)
+        self._send_json(404, {'error': 'Not found'})
+
+
+def serve(host=SERVICE_HOST, port=SERVICE_PORT, workers=REPORT_WORKERS, max_pending=MAX_PENDING_JOBS):
+    service = ReportService(workers=workers, max_pending=max_pending)
+    server = ThreadingHTTPServer((host, port), ReportRequestHandler)
+    server.daemon_threads = True
+    server.service = service
+    print(f"Report service listening on http://{host}:{port} with {workers} workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve PDF reports over HTTP")
+    parser.add_argument('--host', default=SERVICE_HOST)
+    parser.add_argument('--port', type=int, default=SERVICE_PORT)
+    parser.add_argument('--workers', type=int, default=REPORT_WORKERS, help="Reports rendered in parallel")
+    parser.add_argument('--max-pending', type=int, default=MAX_PENDING_JOBS,
+                        help="Distinct reports queued or running before requests are refused")
+    args = parser.parse_args()
+    serve(args.host, args.port, args.workers, args.max_pending)
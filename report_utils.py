@@ -1,40 +1,136 @@
 # report_utils.py
 import base64
-import matplotlib.pyplot as plt
+import hashlib
+import os
+import shutil
+from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor
+from matplotlib.figure import Figure
 import seaborn as sns
 import pandas as pd
+from data_cache import CACHE_DIR, record_file, touch_file, temp_path
+from downsampling import downsample_series
+from kpis import compute_kpis
+from instrumentation import instrument
 
-def create_trend_chart_base64(df):
-    """Create trend chart and return as base64 string"""
-    try:
-        sns.set_style("whitegrid")
-        plt.rcParams['figure.figsize'] = (14, 7)
-        
-        fig, ax1 = plt.subplots(figsize=(14, 7))
+# 14in wide at 100 dpi: more points than this can't be told apart
+TREND_CHART_MAX_POINTS = 1400
+CHART_DPI = 100
+CHART_CACHE_DIR = os.path.join(CACHE_DIR, 'charts')
+
+# Charts are drawn on standalone Figure objects (no pyplot state machine),
+# so they are safe to render in parallel worker processes
+
+def _draw_trend_chart(df):
+    close = downsample_series(df['close'], TREND_CHART_MAX_POINTS)
+    sales = downsample_series(df['sales'], TREND_CHART_MAX_POINTS)
+
+    with sns.axes_style("whitegrid"):
+        fig = Figure(figsize=(14, 7))
+        ax1 = fig.subplots()
         color = 'tab:red'
         ax1.set_xlabel('Date')
         ax1.set_ylabel('Stock Price (Close)', color=color)
-        ax1.plot(df.index, df['close'], color=color, label='Stock Price', linewidth=2)
+        ax1.plot(close.index, close, color=color, label='Stock Price', linewidth=2)
         ax1.tick_params(axis='y', labelcolor=color)
         
         ax2 = ax1.twinx()
         color = 'tab:blue'
         ax2.set_ylabel('Marketing Sales', color=color)
-        ax2.plot(df.index, df['sales'], color=color, label='Marketing Sales', linestyle='--')
+        ax2.plot(sales.index, sales, color=color, label='Marketing Sales', linestyle='--')
         ax2.tick_params(axis='y', labelcolor=color)
         
-        plt.title('Trend Analysis: Stock Price vs. Marketing Sales Over Time', fontsize=16)
+        ax1.set_title('Trend Analysis: Stock Price vs. Marketing Sales Over Time', fontsize=16)
         fig.tight_layout()
-        
-        # Save to buffer and convert to base64
-        from io import BytesIO
-        buffer = BytesIO()
-        plt.savefig(buffer, format='png', dpi=100, bbox_inches='tight')
-        buffer.seek(0)
-        image_base64 = base64.b64encode(buffer.read()).decode('utf-8')
-        plt.close()
-        
-        return image_base64
+    return fig
+
+def _draw_roas_chart(df):
+    with sns.axes_style("whitegrid"):
+        fig = Figure(figsize=(10, 6))
+        ax = fig.subplots()
+        sns.boxplot(data=df, x='campaign_id', y='roas', ax=ax)
+        ax.set_title('Return on Ad Spend (ROAS) by Marketing Campaign', fontsize=14)
+        ax.set_xlabel('Campaign ID')
+        ax.set_ylabel('ROAS')
+    return fig
+
+# Chart kind -> (drawing function, columns it reads)
+CHARTS = {
+    'trend': (_draw_trend_chart, ['close', 'sales']),
+    'roas': (_draw_roas_chart, ['campaign_id', 'roas']),
+}
+
+def chart_cache_key(kind, df, fmt='png', dpi=CHART_DPI):
+    """Content hash of the rows a chart plots, plus its output settings"""
+    _, columns = CHARTS[kind]
+    row_hashes = pd.util.hash_pandas_object(df[columns], index=True).to_numpy()
+    digest = hashlib.sha1(row_hashes.tobytes())
+    digest.update(f"{kind}:{fmt}:{dpi}".encode('utf-8'))
+    return digest.hexdigest()
+
+@instrument()
+def render_chart(kind, df, fmt='png', output_path=None, dpi=CHART_DPI, use_cache=True):
+    """
+    Renders a chart ('trend' or 'roas') as PNG or SVG.
+    Returns the image bytes, or writes straight to output_path and returns the path.
+    Rendered images are cached by a content hash of the plotted data (see chart_file).
+    """
+    if use_cache:
+        path = chart_file(kind, df, fmt, dpi)
+        if output_path:
+            shutil.copyfile(path, output_path)
+            return output_path
+        with open(path, 'rb') as f:
+            return f.read()
+
+    draw, _ = CHARTS[kind]
+    fig = draw(df)
+    if output_path:
+        fig.savefig(output_path, format=fmt, dpi=dpi, bbox_inches='tight')
+        return output_path
+    buffer = BytesIO()
+    fig.savefig(buffer, format=fmt, dpi=dpi, bbox_inches='tight')
+    return buffer.getvalue()
+
+@instrument()
+def chart_file(kind, df, fmt='png', dpi=CHART_DPI):
+    """
+    Absolute path of the cached image for a chart, rendering it first if needed.
+    Templates can reference this file directly instead of an inline base64 data URI.
+    Cached images count towards the data cache's size cap and are evicted least recently used first.
+    """
+    path = os.path.abspath(os.path.join(CHART_CACHE_DIR, f"{chart_cache_key(kind, df, fmt, dpi)}.{fmt}"))
+    if os.path.exists(path):
+        touch_file(path)
+        return path
+
+    os.makedirs(CHART_CACHE_DIR, exist_ok=True)
+    draw, _ = CHARTS[kind]
+    tmp_path = temp_path(path)
+    draw(df).savefig(tmp_path, format=fmt, dpi=dpi, bbox_inches='tight')
+    os.replace(tmp_path, path)
+    record_file(path)
+    return path
+
+def render_charts(df, kinds=('trend', 'roas'), fmt='png', output_dir=None, max_workers=None):
+    """
+    Renders several charts, in a process pool when max_workers > 1.
+    Returns {kind: bytes}, or {kind: file path} when output_dir is given.
+    """
+    paths = {kind: os.path.join(output_dir, f"{kind}_chart.{fmt}") if output_dir else None for kind in kinds}
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    if not max_workers or max_workers <= 1:
+        return {kind: render_chart(kind, df, fmt, paths[kind]) for kind in kinds}
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {kind: executor.submit(render_chart, kind, df[CHARTS[kind][1]], fmt, paths[kind]) for kind in kinds}
+        return {kind: future.result() for kind, future in futures.items()}
+
+def create_trend_chart_base64(df):
+    """Create trend chart and return as base64 string"""
+    try:
+        return base64.b64encode(render_chart('trend', df)).decode('utf-8')
     except Exception as e:
         print(f"Error creating trend chart: {e}")
         return None
@@ -42,29 +138,17 @@ def create_trend_chart_base64(df):
 def create_roas_chart_base64(df):
     """Create ROAS chart and return as base64 string"""
     try:
-        plt.figure(figsize=(10, 6))
-        sns.boxplot(data=df, x='campaign_id', y='roas')
-        plt.title('Return on Ad Spend (ROAS) by Marketing Campaign', fontsize=14)
-        plt.xlabel('Campaign ID')
-        plt.ylabel('ROAS')
-        
-        # Save to buffer and convert to base64
-        from io import BytesIO
-        buffer = BytesIO()
-        plt.savefig(buffer, format='png', dpi=100, bbox_inches='tight')
-        buffer.seek(0)
-        image_base64 = base64.b64encode(buffer.read()).decode('utf-8')
-        plt.close()
-        
-        return image_base64
+        return base64.b64encode(render_chart('roas', df)).decode('utf-8')
     except Exception as e:
         print(f"Error creating ROAS chart: {e}")
         return None
 
-def generate_insights(df):
+def generate_insights(df, kpis=None):
     """Generate insights from the data"""
+    kpis = kpis or compute_kpis(df)
+
     # Trend insight
-    correlation = df['sales'].corr(df['close'])
+    correlation = kpis.sales_close_corr
     if correlation > 0.5:
         trend_insight = "Strong positive correlation observed between marketing sales and stock price. Increased sales activity appears to correlate with higher stock valuations."
     elif correlation < -0.5:
@@ -73,8 +157,8 @@ def generate_insights(df):
         trend_insight = "No strong correlation detected between daily marketing sales and stock price movements in this period."
     
     # ROAS insight
-    best_campaign = df.groupby('campaign_id')['roas'].mean().idxmax()
-    worst_campaign = df.groupby('campaign_id')['roas'].mean().idxmin()
+    best_campaign = kpis.best_campaign
+    worst_campaign = kpis.worst_campaign
     roas_insight = f"Campaign '{best_campaign}' demonstrates the highest average ROAS, making it our most efficient campaign. Campaign '{worst_campaign}' may require optimization or review."
     
-    return trend_insight, roas_insight
\ No newline at end of file
+    return trend_insight, roas_insight
@@ -0,0 +1,182 @@
+# shared_cache.py
+import os
+import time
+import pickle
+import sqlite3
+import threading
+import functools
+from collections import defaultdict
+from data_cache import CACHE_DIR
+
+# A cache shared by every dashboard worker process on the host, so a figure for a popular
+# symbol is computed once and reused by all workers. Uses diskcache when it is installed,
+# otherwise an equivalent SQLite file (standard library only).
+SHARED_CACHE_DIR = os.getenv('SHARED_CACHE_DIR', os.path.join(CACHE_DIR, 'shared'))
+SHARED_CACHE_TTL_SECONDS = int(os.getenv('SHARED_CACHE_TTL_SECONDS', 60 * 60))
+SHARED_CACHE_MAX_BYTES = int(os.getenv('SHARED_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+# The SQLite backend checks its size limit every this many writes
+EVICT_EVERY_WRITES = 100
+
+try:
+    import diskcache
+except ImportError:
+    diskcache = None
+
+_MISSING = object()
+
+
+class _SQLiteBackend:
+    """Pickled values in an SQLite table, with per-entry expiry and a total size limit"""
+
+    def __init__(self, directory, max_bytes):
+        self.path = os.path.join(directory, 'cache.sqlite')
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._writes = 0
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('''CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL,
+                stored_at REAL NOT NULL, expires_at REAL)''')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key, default=None):
+        row = self._connection().execute('SELECT value, expires_at FROM cache WHERE key = ?', (key,)).fetchone()
+        if row is None or (row[1] is not None and row[1] < time.time()):
+            return default
+        return pickle.loads(row[0])
+
+    def set(self, key, value, expire=None):
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            conn.execute('INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?)',
+                         (key, sqlite3.Binary(blob), len(blob), now, now + expire if expire else None))
+        self._writes += 1
+        if self._writes % EVICT_EVERY_WRITES == 0:
+            self._evict(conn, now)
+
+    def _evict(self, conn, now):
+        with conn:
+            conn.execute('DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at < ?', (now,))
+            total = 0
+            stale = []
+            # Newest entries are kept until the size limit is reached
+            for key, size in conn.execute('SELECT key, size FROM cache ORDER BY stored_at DESC'):
+                total += size
+                if total > self.max_bytes:
+                    stale.append((key,))
+            conn.executemany('DELETE FROM cache WHERE key = ?', stale)
+
+    def clear(self):
+        with self._connection() as conn:
+            conn.execute('DELETE FROM cache')
+
+
+class SharedCache:
+    """
+    Cross-process get-or-compute cache with hit/miss counters per kind of value.
+    Keys should carry everything the value depends on (e.g. symbol and data version),
+    so entries never need explicit invalidation. Concurrent misses for the same key
+    within a process are computed once; other processes may compute it in parallel.
+    """
+
+    def __init__(self, directory=SHARED_CACHE_DIR, ttl_seconds=SHARED_CACHE_TTL_SECONDS,
+                 max_bytes=SHARED_CACHE_MAX_BYTES):
+        if diskcache is not None:
+            self._backend = diskcache.Cache(directory, size_limit=max_bytes)
+        else:
+            self._backend = _SQLiteBackend(directory, max_bytes)
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self.hits = defaultdict(int)
+        self.misses = defaultdict(int)
+        self.errors = defaultdict(int)
+
+    def _count(self, counter, kind):
+        with self._lock:
+            counter[kind] += 1
+
+    def _read(self, key, kind):
+        try:
+            return self._backend.get(key, _MISSING)
+        except Exception as e:
+            # A broken cache must never break the dashboard: fall back to computing
+            print(f"Shared cache read failed for {key}: {e}")
+            self._count(self.errors, kind)
+            return _MISSING
+
+    def get_or_set(self, key, factory, kind='default'):
+        value = self._read(key, kind)
+        if value is not _MISSING:
+            self._count(self.hits, kind)
+            return value
+
+        with self._lock:
+            key_lock = self._inflight.setdefault(key, threading.Lock())
+        try:
+            with key_lock:
+                # Another thread may have filled it while we waited
+                value = self._read(key, kind)
+                if value is not _MISSING:
+                    self._count(self.hits, kind)
+                    return value
+                self._count(self.misses, kind)
+                value = factory()
+                try:
+                    self._backend.set(key, value, expire=self.ttl_seconds)
+                except Exception as e:
+                    print(f"Shared cache write failed for {key}: {e}")
+                    self._count(self.errors, kind)
+                return value
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def cached(self, kind):
+        """Decorator: caches func(*args) under '<kind>:<args>'. Arguments must be strings or numbers."""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args):
+                key = ':'.join([kind] + [str(arg) for arg in args])
+                return self.get_or_set(key, lambda: func(*args), kind)
+            return wrapper
+        return decorator
+
+    def stats(self):
+        with self._lock:
+            kinds = sorted(set(self.hits) | set(self.misses) | set(self.errors))
+            return {kind: {'hits': self.hits[kind], 'misses': self.misses[kind], 'errors': self.errors[kind]}
+                    for kind in kinds}
+
+    def render(self):
+        """Hit/miss/error counters of this process in Prometheus text format"""
+        lines = ['# HELP dashboard_shared_cache_requests_total Shared cache lookups by kind and result.',
+                 '# TYPE dashboard_shared_cache_requests_total counter']
+        for kind, counts in self.stats().items():
+            for counter, result in (('hits', 'hit'), ('misses', 'miss'), ('errors', 'error')):
+                lines.append(f'dashboard_shared_cache_requests_total{{kind="{kind}",result="{result}"}} {counts[counter]}')
+        return '\n'.join(lines) + '\n'
+
+    def clear(self):
+        self._backend.clear()
+
+
+def render_lru_metrics(functions):
+    """Hits/misses of in-process functools.lru_cache functions in Prometheus text format"""
+    lines = ['# HELP dashboard_local_cache_requests_total In-process cache lookups by function and result.',
+             '# TYPE dashboard_local_cache_requests_total counter']
+    for func in functions:
+        info = func.cache_info()
+        lines.append(f'dashboard_local_cache_requests_total{{cache="{func.__name__}",result="hit"}} {info.hits}')
+        lines.append(f'dashboard_local_cache_requests_total{{cache="{func.__name__}",result="miss"}} {info.misses}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,265 @@
+# snapshot.py
+import os
+import threading
+import time
+from dataclasses import dataclass
+import pandas as pd
+from data_cache import CACHE_DIR, frame_version
+from kpis import compute_kpis
+from aggregate_cube import AggregateCube
+
+# The last cleaned frame, written as an Arrow IPC (Feather v2) file so every worker
+# can memory-map the same pages instead of holding its own copy (numeric columns
+# without missing values; the others are converted per process)
+SNAPSHOT_PATH = os.path.join(CACHE_DIR, 'dashboard_snapshot.arrow')
+LOCK_PATH = SNAPSHOT_PATH + '.lock'
+# The aggregate cube of the same frame, stored next to it
+CUBE_SUFFIX = '.cube.npz'
+# A snapshot written more recently than this is reused instead of reloading
+SNAPSHOT_MAX_AGE_SECONDS = int(os.getenv('SNAPSHOT_MAX_AGE_SECONDS', 15 * 60))
+# How often the dashboard refreshes its data in the background (0 disables the schedule)
+REFRESH_INTERVAL_SECONDS = int(os.getenv('SNAPSHOT_REFRESH_SECONDS', SNAPSHOT_MAX_AGE_SECONDS))
+# Previous versions kept so in-flight requests for them still resolve
+KEEP_VERSIONS = 3
+
+try:
+    import pyarrow.feather as feather
+except ImportError:
+    feather = None
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # Not available on Windows: each worker refreshes on its own
+
+
+def snapshot_path(symbol=None):
+    """Snapshot file for a symbol (the default file when symbol is None)"""
+    if symbol is None:
+        return SNAPSHOT_PATH
+    return os.path.join(CACHE_DIR, f"dashboard_snapshot_{symbol.upper()}.arrow")
+
+
+def save_snapshot(df, path=SNAPSHOT_PATH):
+    """Writes the cleaned frame to the shared snapshot file (atomically)"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    if feather is not None:
+        # Feather needs a default index, so the date index is stored as a column
+        feather.write_feather(df.reset_index(), tmp_path, compression='uncompressed')
+    else:
+        df.to_pickle(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def snapshot_age(path=SNAPSHOT_PATH):
+    """Seconds since the snapshot file was written, or None if there is none"""
+    try:
+        return time.time() - os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+def load_snapshot(path=SNAPSHOT_PATH):
+    """Reads the snapshot file (memory-mapped when pyarrow is available), or returns None"""
+    if not os.path.exists(path):
+        return None
+    try:
+        if feather is not None:
+            table = feather.read_table(path, memory_map=True)
+            # Build the index from the date column and attach it without set_index, which would
+            # copy every column: numeric columns without missing values stay views of the mapped file
+            index_name = table.column_names[0]
+            index = pd.DatetimeIndex(table.column(0).to_pandas(), name=index_name)
+            df = table.drop([index_name]).to_pandas(split_blocks=True)
+            df.index = index
+            return df
+        return pd.read_pickle(path)
+    except Exception as e:
+        print(f"Error reading snapshot {path}: {e}")
+        return None
+
+
+@dataclass(frozen=True)
+class DataSnapshot:
+    """
+    The dashboard frame together with its version, headline KPIs and aggregate cube.
+    Snapshots are never modified after they are built (treat df as read-only too); a refresh
+    builds a new one and swaps it in.
+    """
+    df: pd.DataFrame
+    version: str
+    kpis: object
+    cube: AggregateCube
+    loaded_at: float
+
+    @classmethod
+    def build(cls, df, version=None, cube=None):
+        version = version or frame_version(df)
+        return cls(df=df, version=version, kpis=compute_kpis(df),
+                   cube=cube or AggregateCube.build(df, version), loaded_at=time.time())
+
+    def positions(self, start_date=None, end_date=None):
+        """Row positions [a, b) covered by an inclusive date range, like df.loc[start:end]"""
+        index = self.df.index
+        a = 0 if start_date is None else index.searchsorted(pd.Timestamp(start_date), side='left')
+        b = len(index) if end_date is None else index.searchsorted(pd.Timestamp(end_date), side='right')
+        return a, max(a, b)
+
+
+class SnapshotHolder:
+    """
+    Holds the snapshot served to callbacks. It starts from the file on disk (if any)
+    and is replaced whenever a (scheduled) refresh produces new data.
+
+    Readers never lock: publishing assigns a new snapshot and a new version map in single
+    attribute stores, so a callback that reads `current` once sees one consistent snapshot.
+    The last few versions stay reachable through get(), so requests made against a
+    previous version still resolve while clients catch up.
+    """
+
+    def __init__(self, loader, path=SNAPSHOT_PATH, keep_versions=KEEP_VERSIONS):
+        self.loader = loader
+        self.path = path
+        self.keep_versions = keep_versions
+        self.current = None
+        self.ready = threading.Event()
+        self._versions = {}
+        self._published_at = 0.0
+        self._publish_lock = threading.Lock()  # Serializes writers only
+        self._thread = None
+        self._scheduler = None
+        self._stop = threading.Event()
+
+    def publish(self, df, load_cube=False):
+        """Publishes df as the current snapshot. With load_cube the aggregate cube is read
+        from disk (when it matches the data) instead of being rebuilt."""
+        version = frame_version(df)
+        with self._publish_lock:
+            self._published_at = time.time()
+            if self.current is not None and self.current.version == version:
+                return self.current  # Same data: keep the snapshot (and every cache keyed on it)
+            cube = AggregateCube.load(self.path + CUBE_SUFFIX, version) if load_cube else None
+            snapshot = DataSnapshot.build(df, version, cube)
+            versions = dict(self._versions)
+            versions[version] = snapshot
+            while len(versions) > self.keep_versions:
+                versions.pop(next(iter(versions)))
+            # Swap: readers see either the old or the new snapshot, never a mix
+            self._versions = versions
+            self.current = snapshot
+        self.ready.set()
+        return snapshot
+
+    def get(self, version):
+        """The snapshot with this version, if it is still held. A version this process hasn't
+        seen (e.g. published by another worker) triggers a reload of the snapshot file."""
+        snapshot = self._versions.get(version)
+        if snapshot is None:
+            # Only reload when the file is newer than what this process last published
+            age = snapshot_age(self.path)
+            if age is not None and time.time() - age > self._published_at and self.load_cached():
+                snapshot = self._versions.get(version)
+        return snapshot
+
+    def load_cached(self):
+        """Publishes the on-disk snapshot, if there is one. Returns True on success."""
+        df = load_snapshot(self.path)
+        if df is None or df.empty:
+            return False
+        self.publish(df, load_cube=True)
+        print(f"Loaded cached snapshot. Shape: {df.shape}")
+        return True
+
+    def refresh(self, force=False):
+        """Runs the loader and publishes the result. Only one process runs it at a time;
+        the others wait for it and pick up the snapshot file it wrote.
+        Unless force=True, a snapshot file younger than SNAPSHOT_MAX_AGE_SECONDS is reused."""
+        lock_file = None
+        try:
+            if fcntl is not None:
+                lock_path = LOCK_PATH if self.path == SNAPSHOT_PATH else self.path + '.lock'
+                os.makedirs(os.path.dirname(lock_path) or '.', exist_ok=True)
+                lock_file = open(lock_path, 'w')
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    # Another worker is refreshing: wait for it, then reuse its result
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+            # Another worker (or the refresher process) may have just written a fresh snapshot
+            age = snapshot_age(self.path)
+            if not force and age is not None and age < SNAPSHOT_MAX_AGE_SECONDS:
+                if self.current is not None and self._published_at >= time.time() - age:
+                    return self.current
+                if self.load_cached():
+                    return self.current
+
+            df = self.loader()
+            if df is None or df.empty:
+                print("Background refresh returned no data; keeping current snapshot")
+                return self.current
+            snapshot = self.publish(df)
+            # The cube goes first: other workers reload when the snapshot file changes
+            snapshot.cube.save(self.path + CUBE_SUFFIX)
+            save_snapshot(df, self.path)
+            print(f"Snapshot refreshed. Shape: {df.shape}")
+            return snapshot
+        except Exception as e:
+            print(f"Error refreshing snapshot: {e}")
+            return self.current
+        finally:
+            if lock_file is not None:
+                lock_file.close()  # Releases the lock
+
+    def refresh_in_background(self):
+        self._thread = threading.Thread(target=self.refresh, name='snapshot-refresh', daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def start_scheduler(self, interval_seconds=REFRESH_INTERVAL_SECONDS):
+        """
+        Refreshes every interval_seconds on a daemon thread. Across workers only one runs
+        the loader per interval; the rest load the file it wrote.
+        """
+        if self._scheduler is not None or interval_seconds <= 0:
+            return self._scheduler
+
+        def run():
+            while not self._stop.wait(interval_seconds):
+                self.refresh()
+
+        self._scheduler = threading.Thread(target=run, name='snapshot-scheduler', daemon=True)
+        self._scheduler.start()
+        return self._scheduler
+
+    def stop_scheduler(self):
+        self._stop.set()
+
+    def wait(self, timeout=None):
+        """Blocks until a snapshot is available; returns it (or None on timeout)"""
+        self.ready.wait(timeout)
+        return self.current
+
+
+# Run as a separate refresher process: python snapshot.py [interval_seconds] [SYMBOL ...]
+# Dashboard workers then only load the files it writes.
+if __name__ == "__main__":
+    import sys
+    from data_cleaning import get_clean_data
+    from timeseries_store import get_store
+    interval = int(sys.argv[1]) if len(sys.argv) > 1 else REFRESH_INTERVAL_SECONDS
+    symbols = sys.argv[2:] or ['IBM']
+
+    def loader(symbol):
+        df = get_clean_data(symbol)
+        if not df.empty:
+            get_store().write(symbol, df)
+        return df
+
+    holders = [SnapshotHolder(lambda symbol=symbol: loader(symbol), snapshot_path(symbol)) for symbol in symbols]
+    while True:
+        for holder in holders:
+            holder.refresh(force=True)
+        print(f"Next refresh in {interval}s")
+        time.sleep(interval)
@@ -0,0 +1,276 @@
+# streaming.py
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+from data_acquisition import MARKETING_URL, MARKETING_COLUMNS, DEFAULT_ALIGN_POLICY, align_marketing_dates
+from data_cleaning import MOVING_AVG_WINDOW, clean_and_transform_marketing_data, STOCK_DTYPES
+from kpis import KPIResult, KPI_QUANTILES
+
+# Rows per chunk read from the marketing export
+CHUNK_SIZE = 250_000
+
+# A streaming version of acquisition -> cleaning -> merge for exports larger than memory.
+# Every stage is a generator over date-ordered chunks, so only a few chunks are alive at once.
+
+
+def iter_marketing_chunks(source=MARKETING_URL, chunksize=CHUNK_SIZE, start_date='2023-01-01'):
+    """
+    Reads a marketing CSV in chunks. Rows without a 'date' column get consecutive
+    daily dates from start_date, continuing across chunk boundaries.
+    """
+    next_date = pd.Timestamp(start_date)
+    for chunk in pd.read_csv(source, chunksize=chunksize):
+        chunk = chunk.rename(columns=MARKETING_COLUMNS)
+        if 'date' in chunk.columns:
+            chunk['date'] = pd.to_datetime(chunk['date'])
+        else:
+            chunk['date'] = pd.date_range(start=next_date, periods=len(chunk), freq='D')
+            next_date = chunk['date'].iloc[-1] + pd.Timedelta(days=1)
+        yield chunk.set_index('date')
+
+
+def iter_frame_chunks(df, chunksize=CHUNK_SIZE):
+    """Splits an in-memory frame into consecutive chunks (e.g. a stock series)"""
+    for start in range(0, len(df), chunksize):
+        yield df.iloc[start:start + chunksize]
+
+
+def clean_stock_chunks(chunks):
+    """
+    Adds daily_return and moving_avg_7d to date-ordered stock chunks. The last
+    window-1 closes are carried into the next chunk, so results match the in-memory pipeline.
+    """
+    carry = None
+    for chunk in chunks:
+        chunk = chunk.astype({col: dtype for col, dtype in STOCK_DTYPES.items() if col in chunk.columns})
+        if carry is not None:
+            chunk = pd.concat([carry, chunk])
+        n_carried = 0 if carry is None else len(carry)
+
+        out = chunk.copy(deep=False)
+        out['daily_return'] = out['close'].pct_change() * 100
+        out['moving_avg_7d'] = out['close'].rolling(window=MOVING_AVG_WINDOW).mean()
+        carry = chunk.iloc[-(MOVING_AVG_WINDOW - 1):]
+
+        out = out.iloc[n_carried:].dropna()
+        if not out.empty:
+            yield out
+
+
+def align_marketing_chunks(chunks, stock_dates, policy=None):
+    """
+    Moves date-ordered marketing chunks onto the trading calendar with align_marketing_dates,
+    so weekend and holiday rows are kept exactly as in the in-memory pipeline.
+    Rows that later chunks could still combine with (the last trading day of a chunk for
+    'aggregate', the last marketing date for 'ffill') are carried into the next chunk.
+    """
+    policy = policy or DEFAULT_ALIGN_POLICY
+    trading = np.unique(pd.DatetimeIndex(stock_dates).to_numpy())
+    carry = None
+    covered = None  # ffill: trading days before this have been emitted
+    for chunk in chunks:
+        rows = chunk if carry is None else pd.concat([carry, chunk])
+        dates = rows.index.to_numpy()
+        if policy == 'aggregate':
+            target = np.searchsorted(trading, dates, side='left')
+            hold = target == target.max()
+            carry = rows[hold & (target < len(trading))]  # Rows past the calendar are dropped
+            aligned = align_marketing_dates(rows[~hold], trading, policy) if not hold.all() else None
+        else:
+            last_date = dates.max()
+            days = trading[(trading < last_date) if covered is None else (trading >= covered) & (trading < last_date)]
+            carry = rows[dates == last_date]
+            aligned = align_marketing_dates(rows, days, policy) if len(days) else None
+            covered = last_date
+        if aligned is not None and not aligned.empty:
+            yield aligned
+
+    if carry is not None and not carry.empty:
+        days = trading if covered is None else trading[trading >= covered]
+        aligned = align_marketing_dates(carry, days, policy) if len(days) else None
+        if aligned is not None and not aligned.empty:
+            yield aligned
+
+
+def clean_marketing_chunks(chunks):
+    for chunk in chunks:
+        cleaned = clean_and_transform_marketing_data(chunk, optimized=True)
+        if not cleaned.empty:
+            yield cleaned
+
+
+def merge_chunks(stock_chunks, marketing_chunks):
+    """
+    Inner-joins two date-ordered chunk streams on the date index (a sort-merge join).
+    Stock rows are buffered only until the marketing stream has moved past their date.
+    """
+    stock_iter = iter(stock_chunks)
+    buffer = None
+    exhausted = False
+    for marketing in marketing_chunks:
+        last_date = marketing.index.max()
+        # Pull stock chunks until they cover this marketing chunk
+        while not exhausted and (buffer is None or buffer.empty or buffer.index.max() < last_date):
+            try:
+                nxt = next(stock_iter)
+            except StopIteration:
+                exhausted = True
+                break
+            buffer = nxt if buffer is None else pd.concat([buffer, nxt])
+        if buffer is None:
+            return
+        merged = marketing.join(buffer, how='inner')
+        # Later marketing rows can still share the last date, so keep it
+        buffer = buffer[buffer.index >= last_date]
+        if not merged.empty:
+            yield merged
+
+
+class IncrementalKPIs:
+    """
+    Accumulates the report KPIs chunk by chunk. Means and per-campaign ROAS come from
+    running sums; the sales/close correlation merges per-chunk co-moments (Chan et al.),
+    which stays numerically stable over many chunks. Exact quantiles need all rows,
+    so they are left as NaN here.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.start_date = None
+        self.end_date = None
+        self.final_stock_price = np.nan
+        self.sales_sum = 0.0
+        self.sales_count = 0
+        self.roas_sum = 0.0
+        self.roas_count = 0
+        self.campaign_sums = {}
+        self.campaign_counts = {}
+        # Co-moments of (sales, close)
+        self.n = 0
+        self.mean_x = self.mean_y = 0.0
+        self.m2_x = self.m2_y = self.c_xy = 0.0
+
+    def update(self, chunk):
+        if chunk.empty:
+            return
+        self.rows += len(chunk)
+        first, last = chunk.index.min(), chunk.index.max()
+        self.start_date = first if self.start_date is None else min(self.start_date, first)
+        self.end_date = last if self.end_date is None else max(self.end_date, last)
+        self.final_stock_price = float(chunk['close'].iloc[-1])
+
+        sales = chunk['sales'].to_numpy(dtype=float)
+        roas = chunk['roas'].to_numpy(dtype=float)
+        self.sales_sum += np.nansum(sales)
+        self.sales_count += int((~np.isnan(sales)).sum())
+        self.roas_sum += np.nansum(roas)
+        self.roas_count += int((~np.isnan(roas)).sum())
+
+        grouped = chunk.groupby('campaign_id', observed=True)['roas'].agg(['sum', 'count'])
+        for campaign, row in grouped.iterrows():
+            self.campaign_sums[campaign] = self.campaign_sums.get(campaign, 0.0) + row['sum']
+            self.campaign_counts[campaign] = self.campaign_counts.get(campaign, 0) + int(row['count'])
+
+        close = chunk['close'].to_numpy(dtype=float)
+        pair = ~np.isnan(sales) & ~np.isnan(close)
+        x, y = sales[pair], close[pair]
+        n_b = len(x)
+        if n_b == 0:
+            return
+        mean_x_b, mean_y_b = x.mean(), y.mean()
+        dx_b, dy_b = x - mean_x_b, y - mean_y_b
+        n_a, n = self.n, self.n + n_b
+        delta_x, delta_y = mean_x_b - self.mean_x, mean_y_b - self.mean_y
+        self.m2_x += np.dot(dx_b, dx_b) + delta_x * delta_x * n_a * n_b / n
+        self.m2_y += np.dot(dy_b, dy_b) + delta_y * delta_y * n_a * n_b / n
+        self.c_xy += np.dot(dx_b, dy_b) + delta_x * delta_y * n_a * n_b / n
+        self.mean_x += delta_x * n_b / n
+        self.mean_y += delta_y * n_b / n
+        self.n = n
+
+    def result(self):
+        campaign_roas = pd.Series({c: self.campaign_sums[c] / self.campaign_counts[c]
+                                   for c in self.campaign_sums if self.campaign_counts[c]}, name='roas')
+        denominator = np.sqrt(self.m2_x * self.m2_y)
+        return KPIResult(
+            start_date=self.start_date,
+            end_date=self.end_date,
+            observations=self.rows,
+            avg_sales=self.sales_sum / self.sales_count if self.sales_count else np.nan,
+            avg_roas=self.roas_sum / self.roas_count if self.roas_count else np.nan,
+            final_stock_price=self.final_stock_price,
+            sales_close_corr=self.c_xy / denominator if self.n > 1 and denominator else np.nan,
+            campaign_roas=campaign_roas,
+            campaign_counts=pd.Series(self.campaign_counts, name='count'),
+            best_campaign=campaign_roas.idxmax() if not campaign_roas.empty else None,
+            worst_campaign=campaign_roas.idxmin() if not campaign_roas.empty else None,
+            quantiles=pd.DataFrame(index=list(KPI_QUANTILES), dtype=float),
+        )
+
+
+def write_partitioned_parquet(chunks, output_dir):
+    """
+    Writes chunks to output_dir/month=YYYY-MM/part-NNNNN.parquet (one partition per month)
+    and passes each chunk through, so it can sit in the middle of a generator chain.
+    Parts are written to a temporary directory that replaces output_dir once the stream is
+    exhausted, so parts from an earlier run never mix with the new ones.
+    """
+    output_dir = os.path.abspath(output_dir)
+    parent = os.path.dirname(output_dir)
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=parent, prefix=f".{os.path.basename(output_dir)}.")
+    try:
+        part = 0
+        for chunk in chunks:
+            months = chunk.index.to_period('M')
+            for month in months.unique():
+                partition_dir = os.path.join(tmp_dir, f"month={month}")
+                os.makedirs(partition_dir, exist_ok=True)
+                chunk[months == month].to_parquet(os.path.join(partition_dir, f"part-{part:05d}.parquet"))
+                part += 1
+            yield chunk
+
+        # A non-empty directory can't be replaced in one rename: move the old output aside first
+        old_dir = None
+        if os.path.exists(output_dir):
+            old_dir = tempfile.mkdtemp(dir=parent, prefix=f".{os.path.basename(output_dir)}.old.")
+            os.replace(output_dir, os.path.join(old_dir, 'output'))
+        os.replace(tmp_dir, output_dir)
+        if old_dir is not None:
+            shutil.rmtree(old_dir, ignore_errors=True)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)  # Only left over if the stream stopped early
+
+
+def stream_clean_data(stock_chunks, marketing_chunks, output_dir=None, policy=None):
+    """
+    Runs alignment, cleaning and merging over chunk streams, writing the merged rows to
+    partitioned Parquet when output_dir is given. Returns the KPIs, computed incrementally,
+    so peak memory depends on the marketing chunk size rather than the total data size.
+    The stock stream (one row per trading day) is collected first, since aligning marketing
+    rows needs its trading calendar.
+    """
+    stock_chunks = list(stock_chunks)
+    stock_dates = pd.DatetimeIndex(np.concatenate([chunk.index.to_numpy() for chunk in stock_chunks])
+                                   if stock_chunks else [])
+    aligned = align_marketing_chunks(marketing_chunks, stock_dates, policy) if len(stock_dates) else iter(())
+    merged = merge_chunks(clean_stock_chunks(stock_chunks), clean_marketing_chunks(aligned))
+    if output_dir is not None:
+        merged = write_partitioned_parquet(merged, output_dir)
+
+    kpis = IncrementalKPIs()
+    for chunk in merged:
+        kpis.update(chunk)
+    print(f"Streamed {kpis.rows} merged rows")
+    return kpis.result()
+
+
+# Test the streaming pipeline against the in-memory one
+if __name__ == "__main__":
+    from data_acquisition import get_stock_data
+    stock_raw = get_stock_data("IBM")
+    kpis = stream_clean_data(iter_frame_chunks(stock_raw, 25),
+                             iter_marketing_chunks(chunksize=30, start_date=stock_raw.index.min()))
+    print(kpis)
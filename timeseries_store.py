@@ -0,0 +1,211 @@
+# timeseries_store.py
+import os
+import sqlite3
+import threading
+import numpy as np
+import pandas as pd
+from data_cache import CACHE_DIR, frame_version
+
+# Merged stock + marketing rows for every symbol, in one SQLite file (stdlib, no server)
+STORE_PATH = os.getenv('TIMESERIES_STORE_PATH', os.path.join(CACHE_DIR, 'timeseries.sqlite'))
+TABLE = 'merged'
+# Data version (frame_version) of each symbol's rows, so readers can tell which data they get
+VERSIONS_TABLE = 'versions'
+# seq numbers rows that share (symbol, date, campaign_id), e.g. the repeated rows of the ffill
+# alignment policy, so every row of a frame is stored
+KEY_COLUMNS = ('symbol', 'date', 'campaign_id', 'seq')
+
+
+class TimeSeriesStore:
+    """
+    Merged data keyed by (symbol, date, campaign_id, seq). The table is clustered on that key
+    (WITHOUT ROWID), so a symbol's date range is one contiguous index scan, and query()
+    selects only the requested columns: neither unneeded rows nor columns are read.
+    Dates are stored as integer nanoseconds, missing campaign ids as ''. WAL mode lets
+    readers run while a refresh writes.
+    """
+
+    def __init__(self, path=STORE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._columns = None
+
+    def _connection(self):
+        # sqlite3 connections are per thread
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            columns = [row[1] for row in conn.execute(f'PRAGMA table_info({TABLE})')]
+            if columns and 'seq' not in columns:
+                # Stores written before rows were numbered dropped duplicates: rebuild them
+                print(f"Dropping the store's {TABLE} table (old key without seq); it is refilled on the next write")
+                with conn:
+                    conn.execute(f'DROP TABLE {TABLE}')
+                    conn.execute(f'DROP TABLE IF EXISTS {VERSIONS_TABLE}')
+            conn.execute(f'''CREATE TABLE IF NOT EXISTS {TABLE} (
+                symbol TEXT NOT NULL, date INTEGER NOT NULL, campaign_id TEXT NOT NULL, seq INTEGER NOT NULL,
+                PRIMARY KEY (symbol, date, campaign_id, seq)) WITHOUT ROWID''')
+            conn.execute(f'CREATE INDEX IF NOT EXISTS {TABLE}_campaign ON {TABLE} (symbol, campaign_id, date)')
+            conn.execute(f'CREATE TABLE IF NOT EXISTS {VERSIONS_TABLE} (symbol TEXT PRIMARY KEY, version TEXT)')
+            self._local.conn = conn
+        return conn
+
+    def columns(self):
+        """Value columns currently in the table"""
+        if self._columns is None:
+            rows = self._connection().execute(f'PRAGMA table_info({TABLE})').fetchall()
+            self._columns = [row[1] for row in rows if row[1] not in KEY_COLUMNS]
+        return self._columns
+
+    def has_columns(self, columns):
+        """True if every column is stored (re-reading the schema once, in case another process added some)"""
+        missing = [col for col in columns if col != 'campaign_id' and col not in self.columns()]
+        if missing:
+            self._columns = None
+            missing = [col for col in missing if col not in self.columns()]
+        return not missing
+
+    def _add_columns(self, conn, df):
+        for col in df.columns:
+            if col in KEY_COLUMNS or col in self.columns():
+                continue
+            sql_type = 'REAL' if pd.api.types.is_numeric_dtype(df[col]) else 'TEXT'
+            conn.execute(f'ALTER TABLE {TABLE} ADD COLUMN "{col}" {sql_type}')
+            self._columns.append(col)
+
+    def write(self, symbol, df, replace=True, version=None):
+        """
+        Stores a merged frame (date index, campaign_id column) for a symbol. With replace=True
+        the symbol's previous rows are dropped in the same transaction, so readers see either
+        the old or the new data, and the symbol is recorded as holding `version` (by default
+        frame_version(df)). Appending (replace=False) leaves the symbol without a version, and
+        replaces stored rows with the same (date, campaign_id) and position among that key's rows.
+        Every row of df is stored: query() on the same symbol returns len(df) rows.
+        """
+        version = (version or frame_version(df)) if replace else None
+        conn = self._connection()
+        self._columns = None  # Another process may have added columns
+        frame = df.reset_index()
+        frame = frame.rename(columns={frame.columns[0]: 'date'})
+        frame['date'] = pd.to_datetime(frame['date']).astype('int64')
+        frame['campaign_id'] = frame['campaign_id'].astype(object).where(frame['campaign_id'].notna(), '')
+        frame.insert(0, 'symbol', symbol)
+        frame.insert(3, 'seq', frame.groupby(['date', 'campaign_id'], sort=False).cumcount())
+        value_columns = [col for col in frame.columns if col not in KEY_COLUMNS]
+
+        with conn:
+            self._add_columns(conn, frame[value_columns])
+            if replace:
+                conn.execute(f'DELETE FROM {TABLE} WHERE symbol = ?', (symbol,))
+            names = ', '.join(f'"{col}"' for col in frame.columns)
+            placeholders = ', '.join('?' * len(frame.columns))
+            rows = frame.astype(object).where(frame.notna(), None).itertuples(index=False, name=None)
+            conn.executemany(f'INSERT OR REPLACE INTO {TABLE} ({names}) VALUES ({placeholders})', rows)
+            conn.execute(f'INSERT OR REPLACE INTO {VERSIONS_TABLE} VALUES (?, ?)', (symbol, version))
+        print(f"Stored {len(frame)} rows for {symbol}")
+
+    def version(self, symbol):
+        """Data version of a symbol's stored rows, or None"""
+        row = self._connection().execute(f'SELECT version FROM {VERSIONS_TABLE} WHERE symbol = ?', (symbol,)).fetchone()
+        return row[0] if row else None
+
+    def query(self, symbol, columns=None, start_date=None, end_date=None, campaigns=None, version=None):
+        """
+        Rows of one symbol as a date-indexed DataFrame, like the frame get_clean_data() returns.
+        columns limits what is read (campaign_id is included only if requested; None reads all),
+        start_date/end_date are inclusive and, like campaigns, filtered inside SQLite.
+        With version, returns None unless the stored rows are that data version (checked in
+        the same read transaction, so a concurrent write can't slip in between).
+        """
+        if columns is not None and not self.has_columns(columns):
+            raise KeyError(f"Columns not in the store: {[c for c in columns if c not in self.columns()]}")
+        selected = list(self.columns()) + ['campaign_id'] if columns is None else list(columns)
+
+        where, params = ['symbol = ?'], [symbol]
+        if start_date is not None:
+            where.append('date >= ?')
+            params.append(int(pd.Timestamp(start_date).value))
+        if end_date is not None:
+            end = pd.Timestamp(end_date)
+            # A date without a time covers the whole day, as with df.loc[start:end]
+            if end == end.normalize():
+                end = end + pd.Timedelta(days=1) - pd.Timedelta(1, 'ns')
+            where.append('date <= ?')
+            params.append(int(end.value))
+        if campaigns is not None:
+            campaigns = [str(c) for c in campaigns]
+            where.append(f"campaign_id IN ({', '.join('?' * len(campaigns))})")
+            params.extend(campaigns)
+
+        names = ', '.join(['date'] + [f'"{col}"' for col in selected])
+        sql = f"SELECT {names} FROM {TABLE} WHERE {' AND '.join(where)} ORDER BY date"
+        conn = self._connection()
+        if version is None:
+            df = pd.read_sql_query(sql, conn, params=params)
+        else:
+            conn.execute('BEGIN')
+            try:
+                if self.version(symbol) != version:
+                    return None
+                df = pd.read_sql_query(sql, conn, params=params)
+            finally:
+                conn.execute('COMMIT')
+        df['date'] = pd.to_datetime(df['date'].to_numpy(dtype=np.int64))
+        for col in selected:
+            if col != 'campaign_id':
+                df[col] = pd.to_numeric(df[col], errors='coerce')
+        if 'campaign_id' in selected:
+            df['campaign_id'] = df['campaign_id'].replace('', np.nan)
+        return df.set_index('date')
+
+    def date_range(self, symbol):
+        """(first, last) date stored for a symbol, or (None, None)"""
+        first, last = self._connection().execute(
+            f'SELECT MIN(date), MAX(date) FROM {TABLE} WHERE symbol = ?', (symbol,)).fetchone()
+        if first is None:
+            return None, None
+        return pd.Timestamp(first), pd.Timestamp(last)
+
+    def symbols(self):
+        return [row[0] for row in self._connection().execute(f'SELECT DISTINCT symbol FROM {TABLE} ORDER BY symbol')]
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+_default_store = None
+
+
+def get_store():
+    """The process-wide store at STORE_PATH"""
+    global _default_store
+    if _default_store is None:
+        _default_store = TimeSeriesStore()
+    return _default_store
+
+
+# Check that a write round-trips (duplicate keys, missing campaign ids), then load the live
+# data into the store and read a window back
+if __name__ == "__main__":
+    import tempfile
+    from data_cleaning import get_clean_data
+    check_store = TimeSeriesStore(os.path.join(tempfile.mkdtemp(), 'check.sqlite'))
+    dates = pd.to_datetime(['2024-01-02', '2024-01-02', '2024-01-02', '2024-01-03'])
+    check = pd.DataFrame({'campaign_id': ['a', 'a', None, 'b'], 'sales': [1.0, 2.0, 3.0, 4.0]},
+                         index=pd.DatetimeIndex(dates, name='date'))
+    check_store.write('CHECK', check)
+    round_trip = check_store.query('CHECK', ['campaign_id', 'sales'])
+    assert len(round_trip) == len(check) and round_trip['sales'].sum() == check['sales'].sum(), round_trip
+    print("Round trip OK")
+
+    store = get_store()
+    store.write("IBM", get_clean_data("IBM"))
+    first, last = store.date_range("IBM")
+    print(f"IBM stored from {first} to {last}")
+    print(store.query("IBM", ['close', 'sales'], start_date=last - pd.Timedelta(days=30)).tail())